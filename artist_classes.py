@@ -20,19 +20,93 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import base64
 import logging
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+from functools import lru_cache
+
 import requests
+from requests.adapters import HTTPAdapter
 
 from openai import OpenAI
 import pygame
-import stability_sdk.interfaces.gooseai.generation.generation_pb2 as generation
-from stability_sdk import client
 
 from log_config import get_logger_name
 
 logger = logging.getLogger(get_logger_name())
 
+# Colors are parsed from their names once rather than on every render
+BLACK = pygame.Color("black")
+WHITE = pygame.Color("white")
+YELLOW = pygame.Color("yellow")
+
+
+def create_session(pool_size: int = 4) -> requests.Session:
+    """
+    Create a requests session that keeps connections open between requests,
+    so that each request to the same host does not need a new TLS handshake.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return session
+
+
+def read_body(response: requests.Response) -> bytes:
+    """
+    Read the body of a streamed response in one read from the connection.
+
+    Unlike response.content, which joins a list of small chunks, this does
+    not need a second copy of the whole body.
+    """
+    return response.raw.read(decode_content=True)
+
+
+def download_image(url: str, session: requests.Session | None = None) -> bytes:
+    """
+    Download a generated image.
+
+    Downloading the image from its URL avoids the larger base64-encoded
+    response and the decoding step. If a session is provided, its pooled
+    connections are used.
+    """
+    http_get = session.get if session else requests.get
+
+    with http_get(url, stream=True) as response:
+        response.raise_for_status()
+        return read_body(response)
+
+
+@lru_cache(maxsize=64)
+def get_font(name: str, size: int) -> pygame.font.Font:
+    """
+    Get a system font, loading it only the first time a given name and size
+    is requested.
+
+    Font objects can be reused, so there is no need to parse the font file
+    every time text is rendered.
+    """
+    return pygame.font.SysFont(name, size)
+
+
+@lru_cache(maxsize=16)
+def render_text(
+    font_name: str, size: int, text: str, color: tuple[int, int, int] = (255, 255, 255)
+) -> pygame.Surface:
+    """
+    Render antialiased text, rasterizing it only the first time a given
+    string is requested in a given font, size and color. Intended for the
+    small fixed set of status messages, which are shown over and over.
+
+    Returned surface is shared between callers, so it must only be used as a
+    source for blitting and never drawn on.
+    """
+    return get_font(font_name, size).render(text, True, pygame.Color(*color))
+
 
 class ArtistCreation:
     """
@@ -53,12 +127,27 @@ class ArtistCreation:
         self.is_daydream = is_daydream
 
 
+@dataclass(frozen=True, slots=True)
+class VerseLayout:
+    """
+    Font size, total height and rendered lines of a verse that has been
+    fitted to the space beside the image.
+    """
+
+    font_size: int
+    total_height: int
+    line_surfaces: list[pygame.Surface]
+
+
 class ArtistCanvas:
     """
     Class representing the visible surface on which the ArtistCreation object
     will be rendered.
     """
 
+    # Smallest font size that will be used for the verse, however long it is
+    MIN_VERSE_FONT_SIZE = 8
+
     def __init__(
         self,
         width: int,
@@ -79,10 +168,14 @@ class ArtistCanvas:
         self._verse_font_max_size = verse_font_max_size
         self._verse_line_spacing = verse_line_spacing
 
-        self._surface = pygame.Surface(size=(width, height))
+        self._center_y = height // 2
+
+        # Converting to the display pixel format makes blitting to the display
+        # a straight copy. Requires the display to be initialized first.
+        self._surface = pygame.Surface(size=(width, height)).convert()
 
     def _get_verse_font_size(self, verse_lines: list[str], max_verse_width: int) -> int:
-        font_obj = pygame.font.SysFont(self._verse_font_name, self._verse_font_max_size)
+        font_obj = get_font(self._verse_font_name, self._verse_font_max_size)
         longest_line_size = 0
 
         # Need to check pizel size of each line to account for
@@ -93,44 +186,70 @@ class ArtistCanvas:
                 longest_line_size = text_size[0]
                 longest_line = line
 
-        font_size = self._verse_font_max_size
-        will_fit = False
+        if longest_line_size < max_verse_width:
+            return self._verse_font_max_size
 
-        while not will_fit:
-            font_obj = pygame.font.SysFont(self._verse_font_name, font_size)
+        # Binary search for the largest size at which the longest line fits
+        min_size = self.MIN_VERSE_FONT_SIZE
+        max_size = self._verse_font_max_size
+
+        # Since width scales almost linearly with size, the first guess is
+        # the size scaled down by how much the longest line is too wide. This
+        # is usually within a size or two of the result.
+        font_size = self._verse_font_max_size * max_verse_width // longest_line_size
+        font_size = max(min_size, min(font_size, max_size))
+        first_guess = True
+
+        while min_size < max_size:
+            font_obj = get_font(self._verse_font_name, font_size)
 
             text_size = font_obj.size(longest_line)
 
             if text_size[0] < max_verse_width:
-                will_fit = True
+                min_size = font_size
             else:
-                font_size -= 2
+                max_size = font_size - 1
 
-        return font_size
+            if first_guess:
+                # Check the neighbouring size next, which settles the search
+                # when the guess was off by one
+                font_size = font_size + 1 if min_size == font_size else max_size
+                first_guess = False
+            else:
+                font_size = (min_size + max_size + 1) // 2
 
-    def _get_verse_total_height(
-        self, verse_lines: list[str], verse_font_size: int
-    ) -> int:
-        font_obj = pygame.font.SysFont(self._verse_font_name, verse_font_size)
+        return min_size
 
-        total_height = 0
+    def _layout_verse(
+        self, verse_lines: list[str], max_verse_width: int
+    ) -> VerseLayout:
+        """
+        Measure and render the verse in a single pass so that render_creation
+        can blit the lines without measuring them again.
+        """
+        font_size = self._get_verse_font_size(verse_lines, max_verse_width)
+        font_obj = get_font(self._verse_font_name, font_size)
 
-        for line in verse_lines:
-            text_size = font_obj.size(line)
+        # Every line rendered in the same font has the same height, so there
+        # is no need to measure each line
+        line_height = font_obj.get_height() + self._verse_line_spacing
 
-            total_height += text_size[1]
-            total_height += self._verse_line_spacing
+        # No spacing is needed after the last line
+        total_height = len(verse_lines) * line_height - self._verse_line_spacing
 
-        total_height -= self._verse_line_spacing
+        # Verse lines are not cached since each verse is only rendered once
+        line_surfaces = [font_obj.render(line, True, WHITE) for line in verse_lines]
 
-        return total_height
+        return VerseLayout(
+            font_size=font_size, total_height=total_height, line_surfaces=line_surfaces
+        )
 
     @property
     def surface(self) -> pygame.Surface:
         return self._surface
 
     def clear(self) -> None:
-        self._surface.fill(color=pygame.Color("black"))
+        self._surface.fill(color=BLACK)
 
     def render_creation(self, creation: ArtistCreation, img_side: str) -> None:
         self.clear()
@@ -150,24 +269,17 @@ class ArtistCanvas:
         self._surface.blit(source=creation.img, dest=(img_x, self._vert_margin))
 
         max_verse_width = (self._width - img_width) - (self._horiz_margin * 3)
-        verse_font_size = self._get_verse_font_size(
-            creation.verse_lines, max_verse_width
-        )
+        verse_layout = self._layout_verse(creation.verse_lines, max_verse_width)
 
-        total_height = self._get_verse_total_height(
-            creation.verse_lines, verse_font_size
-        )
+        total_height = verse_layout.total_height
         offset = -total_height // 2
 
-        font_obj = pygame.font.SysFont(self._verse_font_name, verse_font_size)
-
-        for line in creation.verse_lines:
-            text_surface = font_obj.render(line, True, pygame.Color("white"))
+        for text_surface in verse_layout.line_surfaces:
             self._surface.blit(
-                source=text_surface, dest=(verse_x, (self._height // 2) + offset)
+                source=text_surface, dest=(verse_x, self._center_y + offset)
             )
 
-            offset += int(total_height / len(creation.verse_lines))
+            offset += int(total_height / len(verse_layout.line_surfaces))
 
 
 class StatusScreen:
@@ -194,36 +306,123 @@ class StatusScreen:
         self._status_size = status_size
         self._vert_margin = vert_margin
 
-        self._surface = pygame.Surface(size=(width, height))
+        # Converting to the display pixel format makes blitting to the display
+        # a straight copy. Requires the display to be initialized first.
+        self._surface = pygame.Surface(size=(width, height)).convert()
+
+        # Headings never change, so they are rendered once onto a background
+        # that is copied each time the status is rendered
+        self._background = self._render_background()
+
+        # Area covered by the most recently rendered status message
+        self._status_rect: pygame.Rect | None = None
 
     @property
     def surface(self) -> pygame.Surface:
         return self._surface
 
-    def render_status(self, text: str) -> None:
-        self._surface.fill(pygame.Color("black"))
+    def _render_background(self) -> pygame.Surface:
+        background = pygame.Surface(size=(self._width, self._height)).convert()
+        background.fill(BLACK)
 
-        font = pygame.font.SysFont(self._font_name, self._heading1_size)
+        # Rendered text is positioned by its own rect, so it does not need
+        # to be measured separately
+        font = get_font(self._font_name, self._heading1_size)
         heading1 = "A.R.T.I.S.T."
-        x_pos = int(self._surface.get_width() / 2 - font.size(heading1)[0] / 2)
         y_pos = self._vert_margin
-        text_surface = font.render(heading1, True, pygame.Color("white"))
-        self._surface.blit(text_surface, (x_pos, y_pos))
+        text_surface = font.render(heading1, True, WHITE)
+        background.blit(
+            text_surface, text_surface.get_rect(midtop=(self._width // 2, y_pos))
+        )
 
-        heading1_height = font.size(heading1)[1]
+        y_pos += text_surface.get_height()
 
-        font = pygame.font.SysFont(self._font_name, self._heading2_size)
+        font = get_font(self._font_name, self._heading2_size)
         heading2 = "Audio-Responsive Transformative Imagination Synthesis Technology"
-        x_pos = int(self._surface.get_width() / 2 - font.size(heading2)[0] / 2)
-        y_pos += heading1_height
-        text_surface = font.render(heading2, True, pygame.Color("white"))
-        self._surface.blit(text_surface, (x_pos, y_pos))
+        text_surface = font.render(heading2, True, WHITE)
+        background.blit(
+            text_surface, text_surface.get_rect(midtop=(self._width // 2, y_pos))
+        )
 
-        font = pygame.font.SysFont(self._font_name, self._status_size)
-        x_pos = int(self._surface.get_width() / 2 - font.size(text)[0] / 2)
-        y_pos = int(self._surface.get_height() / 2 - font.size(text)[1] / 2)
-        text_surface = font.render(text, True, pygame.Color("white"))
-        self._surface.blit(text_surface, (x_pos, y_pos))
+        return background
+
+    def render_status(self, text: str) -> pygame.Rect:
+        """
+        Render a status message and return the area of the surface that
+        changed.
+        """
+        if self._status_rect is None:
+            self._surface.blit(self._background, (0, 0))
+        else:
+            # Only the previous message needs to be erased
+            self._surface.blit(self._background, self._status_rect, self._status_rect)
+
+        text_surface = render_text(self._font_name, self._status_size, text)
+        text_rect = self._surface.blit(
+            text_surface,
+            text_surface.get_rect(center=(self._width // 2, self._height // 2)),
+        )
+
+        if self._status_rect is None:
+            dirty_rect = self._surface.get_rect()
+        else:
+            dirty_rect = text_rect.union(self._status_rect)
+
+        self._status_rect = text_rect
+
+        return dirty_rect
+
+
+class ImageCache:
+    """
+    Class representing a bounded least-recently-used cache of images loaded
+    from disk. Images are loaded on a worker thread so that they can be
+    prefetched before they are needed.
+
+    Not thread-safe; intended to be used only from the main thread.
+    """
+
+    def __init__(self, executor: Executor, max_size: int = 16) -> None:
+        self._executor = executor
+        self._max_size = max_size
+
+        self._images: OrderedDict[str, Future] = OrderedDict()
+
+    def _get_future(self, path: str) -> Future:
+        future = self._images.get(path)
+
+        if future is None:
+            future = self._executor.submit(self._load_image, path)
+            self._images[path] = future
+
+            if len(self._images) > self._max_size:
+                self._images.popitem(last=False)
+        else:
+            self._images.move_to_end(path)
+
+        return future
+
+    @staticmethod
+    def _load_image(path: str) -> pygame.Surface:
+        # Convert to the display pixel format once here rather than on every blit
+        return pygame.image.load(path).convert()
+
+    def prefetch(self, path: str) -> None:
+        """
+        Start loading an image in the background if it is not already cached.
+        """
+        self._get_future(path)
+
+    def get(self, path: str) -> pygame.Surface:
+        """
+        Get an image, waiting for it to load if necessary.
+        """
+        try:
+            return self._get_future(path).result()
+        except Exception:
+            # Don't keep failed loads around so that the next request retries
+            self._images.pop(path, None)
+            raise
 
 
 class StableImageCreator:
@@ -246,6 +445,8 @@ class StableImageCreator:
         self.model = model
         self.sd3_model = sd3_model
 
+        self._session = create_session()
+
     def generate_image_data(self, prompt: str, core_preset: str | None = None) -> bytes:
         # TODO: Clean this up and add model validity checks and more model options
 
@@ -264,20 +465,20 @@ class StableImageCreator:
         if self.sd3_model:
             data["model"] = self.sd3_model
 
-        response = requests.post(
+        with self._session.post(
             f"https://api.stability.ai/v2beta/stable-image/generate/{self.model}",
             headers=headers,
             files=files,
             data=data,
-        )
-
-        if response.status_code == 200:
-            return response.content
-        elif response.status_code == 403:
-            logger.error("Content filter triggered")
-            raise RuntimeError("Content filter triggered")
-        else:
-            raise RuntimeError(f"Stable Image model error: {str(response.json())}")
+            stream=True,
+        ) as response:
+            if response.status_code == 200:
+                return read_body(response)
+            elif response.status_code == 403:
+                logger.error("Content filter triggered")
+                raise RuntimeError("Content filter triggered")
+            else:
+                raise RuntimeError(f"Stable Image model error: {str(response.json())}")
 
 
 class SDXLCreator:
@@ -295,6 +496,13 @@ class SDXLCreator:
         self.steps = steps
         self.cfg_scale = cfg_scale
 
+        # Stability SDK loads a large amount of generated protobuf code, so it
+        # is only imported when this image model is actually used
+        import stability_sdk.interfaces.gooseai.generation.generation_pb2 as generation
+        from stability_sdk import client
+
+        self._generation = generation
+
         self._stability_client = client.StabilityInference(
             key=self.api_key,
             engine="stable-diffusion-xl-1024-v1-0",
@@ -311,23 +519,35 @@ class SDXLCreator:
 
         for r in response:
             for artifact in r.artifacts:
-                if artifact.finish_reason == generation.FILTER:
+                if artifact.finish_reason == self._generation.FILTER:
                     logger.error("Content filter triggered")
                     raise RuntimeError("Content filter triggered")
-                elif artifact.type == generation.ARTIFACT_IMAGE:
+                elif artifact.type == self._generation.ARTIFACT_IMAGE:
                     return artifact.binary
 
         raise RuntimeError("No image artifact returned")
 
 
 class DallE2Creator:
-    def __init__(self, api_key: str, img_width: int, img_height: int) -> None:
+    def __init__(
+        self,
+        api_key: str,
+        img_width: int,
+        img_height: int,
+        openai_client: OpenAI | None = None,
+    ) -> None:
         self.api_key = api_key
         self.img_width = img_width
         self.img_height = img_height
 
-        self._openai_client = OpenAI()
-        self._openai_client.api_key = api_key
+        if openai_client:
+            self._openai_client = openai_client
+        else:
+            self._openai_client = OpenAI()
+            self._openai_client.api_key = api_key
+
+        # Generated images are downloaded from the same host every time
+        self._session = create_session()
 
     def generate_image_data(self, prompt: str) -> bytes:
         img_size = f"{self.img_width}x{self.img_height}"
@@ -337,7 +557,7 @@ class DallE2Creator:
                 model="dall-e-2",
                 prompt=prompt,
                 size=img_size,
-                response_format="b64_json",
+                response_format="url",
                 user="A.R.T.I.S.T.",
             )
         except Exception as e:
@@ -345,20 +565,31 @@ class DallE2Creator:
             logger.exception(e)
             raise
 
-        return base64.b64decode(response.data[0].b64_json)
+        return download_image(response.data[0].url, session=self._session)
 
 
 class DallE3Creator:
     def __init__(
-        self, api_key: str, img_width: int, img_height: int, quality: str = "standard"
+        self,
+        api_key: str,
+        img_width: int,
+        img_height: int,
+        quality: str = "standard",
+        openai_client: OpenAI | None = None,
     ) -> None:
         self.api_key = api_key
         self.img_width = img_width
         self.img_height = img_height
         self.quality = quality
 
-        self._openai_client = OpenAI()
-        self._openai_client.api_key = api_key
+        if openai_client:
+            self._openai_client = openai_client
+        else:
+            self._openai_client = OpenAI()
+            self._openai_client.api_key = api_key
+
+        # Generated images are downloaded from the same host every time
+        self._session = create_session()
 
     def generate_image_data(self, prompt: str) -> bytes:
         img_size = f"{self.img_width}x{self.img_height}"
@@ -369,7 +600,7 @@ class DallE3Creator:
                 prompt=prompt,
                 size=img_size,
                 quality=self.quality,
-                response_format="b64_json",
+                response_format="url",
                 user="A.R.T.I.S.T.",
             )
         except Exception as e:
@@ -377,4 +608,4 @@ class DallE3Creator:
             logger.exception(e)
             raise
 
-        return base64.b64decode(response.data[0].b64_json)
+        return download_image(response.data[0].url, session=self._session)
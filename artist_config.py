@@ -0,0 +1,147 @@
+# MIT License
+
+# Copyright (c) 2023 David Rice
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import logging
+from dataclasses import dataclass, fields
+from typing import Any
+
+from log_config import get_logger_name
+
+logger = logging.getLogger(get_logger_name())
+
+
+@dataclass(frozen=True, slots=True)
+class ArtistConfig:
+    """
+    Class holding the settings loaded from config.json.
+
+    Settings are attributes rather than dictionary items so that reading them
+    in the main loop is a slot access instead of a dictionary lookup. Lists are
+    stored as tuples so that the settings cannot be changed while running.
+    """
+
+    speech_cache_dir: str
+    output_dir: str
+    recents_file_name: str
+    file_name_length: int
+    speech_language: str
+    speech_gender: str
+    speech_voice: str
+    storage_account: str
+    storage_container: str
+    html_template: str
+    input_sample_rate: int
+    max_recording_time: int
+    transcriber_model: str
+    qr_display_time: int
+    prompt_display_time: int
+    image_model: str
+    artist_chat_model: str
+    poet_chat_model: str
+    critic_chat_model: str
+    image_base_prompts: tuple[str, ...]
+    poet_system_prompt: str
+    verse_base_prompt: str
+    critic_system_prompt: str
+    artist_system_prompt: str
+    artist_base_prompt: str
+    use_critic: bool
+    num_verses: int
+    poet_temperature: float
+    poet_frequency_penalty: float
+    poet_presence_penalty: float
+    min_daydream_time: int
+    max_daydream_time: int
+    daydream_iso_weekdays: tuple[int, ...]
+    daydream_start_hour: int
+    daydream_end_hour: int
+    manual_daydream_window: int
+    manual_daydream_limit: int
+    max_recents: int
+    generate_button: int
+    daydream_button: int
+    reveal_qr_button: int
+    reveal_prompt_button: int
+    shutdown_hold_button: int
+    shutdown_press_button: int
+    img_width: int
+    img_height: int
+    display_width: int
+    display_height: int
+    horiz_margin: int
+    vert_margin: int
+    verse_font: str
+    verse_font_size: int
+    verse_line_spacing: int
+    status_font: str
+    status_heading1_size: int
+    status_heading2_size: int
+    status_status_size: int
+    prompt_font: str
+    prompt_font_size: int
+    welcome_words: tuple[str, ...]
+    welcome_lines: tuple[str, ...]
+    daydream_lines: tuple[str, ...]
+    working_lines: tuple[str, ...]
+    finished_lines: tuple[str, ...]
+    failed_lines: tuple[str, ...]
+    daydream_refusal_lines: tuple[str, ...]
+
+    # Only required for the corresponding image_model
+    sdxl_steps: int | None = None
+    sdxl_cfg_scale: float | None = None
+    dalle3_quality: str | None = None
+    stableimage_model: str | None = None
+    sd3_model: str | None = None
+
+    response_cache_file: str = "responses.db"
+
+    # Speech cache files beyond this many are deleted at startup, least
+    # recently used first. No limit if not set.
+    speech_cache_max_files: int | None = None
+
+    # Number of parallel connections used to upload blocks of large blobs
+    storage_max_concurrency: int = 4
+
+    # Present in config.json but not currently used
+    output_sample_rate: int | None = None
+    stable_core_style_presets: tuple[str, ...] | None = None
+
+    @classmethod
+    def from_dict(cls, config: dict[str, Any]) -> "ArtistConfig":
+        """
+        Create the configuration from the dictionary loaded from config.json.
+        Unknown items are ignored with a warning.
+        """
+        field_names = {config_field.name for config_field in fields(cls)}
+
+        for name in config.keys() - field_names:
+            logger.warning(f"Ignoring unknown configuration item: {name}")
+
+        return cls(
+            **{
+                name: tuple(value) if isinstance(value, list) else value
+                for name, value in config.items()
+                if name in field_names
+            }
+        )
@@ -25,14 +25,25 @@ import logging
 from openai import OpenAI
 
 from log_config import get_logger_name
+from response_cache import ResponseCache
 
 logger = logging.getLogger(get_logger_name())
 
 
 class ArtistModerator:
-    def __init__(self, api_key: str) -> None:
-        self._openai_client = OpenAI()
-        self._openai_client.api_key = api_key
+    def __init__(
+        self,
+        api_key: str,
+        cache: ResponseCache | None = None,
+        openai_client: OpenAI | None = None,
+    ) -> None:
+        if openai_client:
+            self._openai_client = openai_client
+        else:
+            self._openai_client = OpenAI()
+            self._openai_client.api_key = api_key
+
+        self._cache = cache
 
     def check_msg(self, msg: str) -> bool:
         """
@@ -40,10 +51,22 @@ class ArtistModerator:
 
         Returns True if message is safe, False if it is not.
         """
+        if self._cache:
+            cache_key = ResponseCache.make_key("moderation", msg)
+            flagged = self._cache.get(cache_key)
+
+            if flagged is not None:
+                if flagged:
+                    logger.info(f"Message flagged by cached moderation: {msg}")
+                else:
+                    logger.info(f"Cached moderation check passed")
+
+                return not flagged
+
         try:
             response = self._openai_client.moderations.create( input=msg)
         except Exception as e:
-            logger.error(f"Moderation response: {response}")
+            logger.error(f"Error getting moderation response")
             logger.exception(e)
             raise
 
@@ -55,4 +78,7 @@ class ArtistModerator:
         else:
             logger.info(f"Moderation check passed")
 
+        if self._cache:
+            self._cache.put(cache_key, flagged)
+
         return not flagged
@@ -24,8 +24,16 @@ import hashlib
 import io
 import logging
 import os
+import queue
+import struct
+import threading
+import time
 import wave
-import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Generator, Iterator
+from xml.sax.saxutils import escape, quoteattr
 
 import azure.cognitiveservices.speech as speechsdk
 
@@ -36,6 +44,16 @@ logger = logging.getLogger(get_logger_name())
 
 
 class ArtistSpeech:
+    # Size of buffer used to read streamed audio from the synthesizer
+    STREAM_CHUNK_SIZE = 4096
+
+    # Short text that is synthesized and discarded to warm up synthesizers
+    WARM_UP_TEXT = "Hello"
+
+    # Age in seconds after which a temporary file left by an interrupted
+    # cache write is deleted by prune_cache()
+    STALE_TEMP_FILE_AGE = 60
+
     def __init__(
         self,
         subscription_key: str,
@@ -48,99 +66,505 @@ class ArtistSpeech:
         channels: int = 1,
         sample_rate: int = 16000,
         sample_width: int = 2,
+        num_synthesizers: int = 3,
+        max_cached_frames: int = 128,
     ) -> None:
         self._cache_dir = cache_dir
 
+        # Audio frames of cached speech that has already been loaded, keyed by
+        # cache file path, so that repeated lines do not touch the filesystem.
+        # Least recently spoken lines are dropped once max_cached_frames is
+        # reached. Lock is needed since prepare_cache() adds frames from
+        # worker threads.
+        self._frames_cache: OrderedDict[str, bytes | memoryview] = OrderedDict()
+        self._max_cached_frames = max_cached_frames
+        self._frames_cache_lock = threading.Lock()
+
+        self._channels = channels
+        self._sample_rate = sample_rate
+        self._sample_width = sample_width
+
         self.language = language
         self.gender = gender
         self.voice = voice
 
+        # Encoded language, gender and voice that start every cache key,
+        # along with the values they were built from so that the prefix is
+        # rebuilt if any of those public attributes are changed later
+        self._hash_prefix_details: tuple[str, str, str] | None = None
+        self._hash_prefix = b""
+
         self.style = None
         self.pitch = None
         self.rate = None
         self.role = None
 
-        speech_config = speechsdk.SpeechConfig(
+        self._speech_config = speechsdk.SpeechConfig(
             subscription=subscription_key, region=region
         )
-        speech_config.set_speech_synthesis_output_format(output_format)
+        self._speech_config.set_speech_synthesis_output_format(output_format)
 
-        self._synthesizer = speechsdk.SpeechSynthesizer(
-            speech_config=speech_config, audio_config=None
-        )
+        # Synthesizers are reused so that each utterance does not pay for a new
+        # connection to the speech service
+        self._num_synthesizers = num_synthesizers
+        self._synthesizer_pool: queue.Queue = queue.Queue()
+
+        for _ in range(num_synthesizers):
+            self._synthesizer_pool.put(self._create_synthesizer())
 
         self._player = AudioPlayer(
             sample_width=sample_width, channels=channels, rate=sample_rate
         )
 
-    def _generate_ssml(self, text: str) -> str:
-        speak_attrib = {
-            "version": "1.0",
-            "xmlns": "http://www.w3.org/2001/10/synthesis",
-            "xmlns:mstts": "https://www.w3.org/2001/mstts",
-            "xml:lang": self.language,
-        }
-
-        ssml_root = ET.Element("speak", speak_attrib)
-
-        ssml_subelements = []
+    def _create_synthesizer(self) -> speechsdk.SpeechSynthesizer:
+        """
+        Create a synthesizer and open its connection in advance so that the
+        first synthesis does not have to wait for the connection to be set up.
+        """
+        synthesizer = speechsdk.SpeechSynthesizer(
+            speech_config=self._speech_config, audio_config=None
+        )
 
-        ssml_subelements.append({"voice": {"name": self.voice}})
+        try:
+            connection = speechsdk.Connection.from_speech_synthesizer(synthesizer)
+            connection.open(True)
+        except Exception as e:
+            # Not fatal since the synthesizer will connect on first use
+            logger.warning("Unable to pre-connect speech synthesizer")
+            logger.exception(e)
+
+        return synthesizer
+
+    def warm_up(self) -> None:
+        """
+        Synthesize and discard a short text on each pooled synthesizer in the
+        background, so that the first line spoken does not have to wait for
+        the speech service to set up its session. Returns immediately.
+        """
+        for _ in range(self._num_synthesizers):
+            threading.Thread(target=self._warm_up_synthesizer, daemon=True).start()
+
+    def _warm_up_synthesizer(self) -> None:
+        try:
+            for _ in self._synthesize_stream(self.WARM_UP_TEXT):
+                pass
+        except Exception as e:
+            # Not fatal since the synthesizer will still work when first used
+            logger.warning("Unable to warm up speech synthesizer")
+            logger.exception(e)
+
+    @contextmanager
+    def _borrow_synthesizer(self) -> Iterator[speechsdk.SpeechSynthesizer]:
+        """
+        Borrow a synthesizer from the pool, replacing it if synthesis fails.
+        """
+        synthesizer = self._synthesizer_pool.get()
+
+        try:
+            yield synthesizer
+        except Exception:
+            synthesizer = self._create_synthesizer()
+            raise
+        finally:
+            self._synthesizer_pool.put(synthesizer)
 
-        express_as_attrib = {}
+    def _generate_ssml(self, text: str) -> str:
+        """
+        Build the SSML document for the text. It only ever has a few nested
+        elements, so it is built directly as a string rather than through an
+        element tree.
+        """
+        open_tags = [
+            '<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" '
+            'xmlns:mstts="https://www.w3.org/2001/mstts" '
+            f"xml:lang={quoteattr(self.language)}>",
+            f"<voice name={quoteattr(self.voice)}>",
+        ]
+        close_tags = ["</speak>", "</voice>"]
+
+        express_as_attrib = ""
 
         if self.style:
-            express_as_attrib["style"] = self.style
+            express_as_attrib += f" style={quoteattr(self.style)}"
 
         if self.role:
-            express_as_attrib["role"] = self.role
+            express_as_attrib += f" role={quoteattr(self.role)}"
 
         if express_as_attrib:
-            ssml_subelements.append({"mstts:express-as": express_as_attrib})
+            open_tags.append(f"<mstts:express-as{express_as_attrib}>")
+            close_tags.append("</mstts:express-as>")
 
-        prosody_attrib = {}
+        prosody_attrib = ""
 
         if self.pitch:
-            prosody_attrib["pitch"] = self.pitch
+            prosody_attrib += f" pitch={quoteattr(self.pitch)}"
 
         if self.rate:
-            prosody_attrib["rate"] = self.rate
+            prosody_attrib += f" rate={quoteattr(self.rate)}"
 
         if prosody_attrib:
-            ssml_subelements.append({"prosody": prosody_attrib})
+            open_tags.append(f"<prosody{prosody_attrib}>")
+            close_tags.append("</prosody>")
 
-        ssml_parent = ssml_root
+        return "".join(open_tags) + escape(text) + "".join(reversed(close_tags))
 
-        for element in ssml_subelements:
-            for tag, attrib in element.items():
-                ssml_parent = ET.SubElement(ssml_parent, tag, attrib)
+    def _synthesize_stream(
+        self, text: str, frames: list[bytes] | None = None
+    ) -> Generator[bytes, None, bool]:
+        """
+        Synthesize text and yield raw PCM audio chunks as they arrive from Azure
+        so that playback can start before synthesis is finished.
 
-        ssml_parent.text = text
+        If frames is provided, each chunk is also appended to it.
 
-        return ET.tostring(ssml_root, encoding="unicode")
+        Returns True if all audio data was received.
+        """
+        with self._borrow_synthesizer() as synthesizer:
+            result = synthesizer.start_speaking_ssml_async(
+                self._generate_ssml(text)
+            ).get()
 
-    def speak_text(self, text: str, use_cache: bool = True) -> None:
-        if use_cache:
-            text_details = self.language + self.gender + self.voice + text
-            text_details_hash = hashlib.sha256(text_details.encode("utf-8")).hexdigest()
+            stream = speechsdk.AudioDataStream(result)
+            audio_buffer = bytes(self.STREAM_CHUNK_SIZE)
+
+            # RIFF output formats include a WAV header at the start of the
+            # stream, which must not be sent to the audio player
+            header = b""
+            in_header = True
+
+            while True:
+                filled_size = stream.read_data(audio_buffer)
+
+                if filled_size == 0:
+                    break
+
+                chunk = audio_buffer[:filled_size]
+
+                if in_header:
+                    header += chunk
+
+                    if len(header) < 4:
+                        continue
 
-            cached_file_path = os.path.join(self._cache_dir, text_details_hash + ".wav")
+                    if header.startswith(b"RIFF"):
+                        data_pos = header.find(b"data")
 
-            if not os.path.exists(cached_file_path):
-                synthesis_result = self._synthesizer.speak_ssml(
-                    self._generate_ssml(text)
+                        if data_pos == -1 or len(header) < data_pos + 8:
+                            continue
+
+                        chunk = header[data_pos + 8 :]
+                    else:
+                        chunk = header
+
+                    in_header = False
+
+                if chunk:
+                    if frames is not None:
+                        frames.append(chunk)
+
+                    yield chunk
+
+        if stream.status != speechsdk.StreamStatus.AllData:
+            logger.error(f"Speech synthesis did not complete for text: {text}")
+            return False
+
+        return True
+
+    def _synthesize_to_cache(
+        self, text: str, cached_file_path: str
+    ) -> Generator[bytes, None, None]:
+        """
+        Stream synthesized audio while also collecting it so it can be written
+        to the cache once synthesis is complete.
+        """
+        frames = []
+
+        complete = yield from self._synthesize_stream(text, frames)
+
+        if complete:
+            audio_frames = b"".join(frames)
+            self._put_cached_frames(cached_file_path, audio_frames)
+
+            os.makedirs(os.path.dirname(cached_file_path), exist_ok=True)
+
+            # Write to a temporary file first and then move it into place so
+            # that an interrupted write can never leave a truncated file in
+            # the cache
+            temp_file_path = cached_file_path + ".tmp." + os.urandom(4).hex()
+
+            with open(temp_file_path, "wb") as cached_file:
+                cached_file.write(
+                    self._get_wav_header(len(audio_frames)) + audio_frames
                 )
 
-                with open(cached_file_path, "wb") as cached_file:
-                    cached_file.write(synthesis_result.audio_data)
+            os.replace(temp_file_path, cached_file_path)
+
+    def _read_ahead(self, chunks: Iterator[bytes]) -> Generator[bytes, None, None]:
+        """
+        Pull chunks from an iterator on a background thread and yield them as
+        they arrive.
+
+        Receiving synthesized audio is then not held up while each chunk is
+        played, so the synthesizer is returned to the pool and the cache file
+        is written as soon as synthesis is finished rather than when playback
+        is. Errors raised by the iterator are raised again here.
+        """
+        chunk_queue: queue.Queue = queue.Queue()
+
+        def produce() -> None:
+            try:
+                for chunk in chunks:
+                    chunk_queue.put(chunk)
+            except Exception as e:
+                chunk_queue.put(e)
+
+            # End of stream marker
+            chunk_queue.put(None)
+
+        threading.Thread(target=produce, daemon=True).start()
+
+        while True:
+            chunk = chunk_queue.get()
+
+            if chunk is None:
+                break
+
+            if isinstance(chunk, Exception):
+                raise chunk
+
+            yield chunk
+
+    def _get_wav_header(self, data_size: int) -> bytes:
+        """
+        Build the canonical 44-byte header of a PCM WAV file holding
+        data_size bytes of audio frames.
+
+        Equivalent to the header written by the wave module, but allows the
+        header and frames to be written to the file in a single call.
+        """
+        block_align = self._channels * self._sample_width
+
+        return struct.pack(
+            "<4sI8sIHHIIHH4sI",
+            b"RIFF",
+            36 + data_size,
+            b"WAVEfmt ",
+            16,
+            1,  # PCM
+            self._channels,
+            self._sample_rate,
+            self._sample_rate * block_align,
+            block_align,
+            self._sample_width * 8,
+            b"data",
+            data_size,
+        )
 
-            with wave.open(cached_file_path, "rb") as cached_file:
-                self._player.play(cached_file.readframes(cached_file.getnframes()))
-        else:
-            synthesis_result = self._synthesizer.speak_ssml(self._generate_ssml(text))
-            audio_data = synthesis_result.audio_data
+    def _get_hash_prefix(self) -> bytes:
+        """
+        Return the UTF-8 encoded language, gender and voice, which are the
+        same for every line spoken, encoding them again only if they change.
+        """
+        prefix_details = (self.language, self.gender, self.voice)
+
+        if prefix_details != self._hash_prefix_details:
+            self._hash_prefix = "".join(prefix_details).encode("utf-8")
+            self._hash_prefix_details = prefix_details
+
+        return self._hash_prefix
+
+    def _get_cache_path(self, text: str) -> str:
+        # Hash the prefix and text separately rather than concatenating them
+        # first, which gives the same key without building a temporary string
+        hasher = hashlib.blake2b(self._get_hash_prefix(), digest_size=16)
+        hasher.update(text.encode("utf-8"))
+
+        text_details_hash = hasher.hexdigest()
+
+        # Cache is split into subdirectories by the first two characters of the
+        # hash to keep directory sizes manageable
+        return os.path.join(
+            self._cache_dir, text_details_hash[:2], text_details_hash + ".wav"
+        )
+
+    def _migrate_legacy_cache_file(self, text: str, cached_file_path: str) -> bool:
+        """
+        Move a file cached by earlier versions, which were named by the SHA-256
+        hash of the text details and not split into subdirectories, to its
+        current location so that it does not need to be synthesized again.
 
-            wav_data = io.BytesIO(audio_data)
+        Returns True if a legacy file was found and moved.
+        """
+        text_details = self.language + self.gender + self.voice + text
+        legacy_hash = hashlib.sha256(text_details.encode("utf-8")).hexdigest()
+        legacy_file_path = os.path.join(self._cache_dir, legacy_hash + ".wav")
 
-            with wave.open(wav_data, "rb") as virtual_file:
-                self._player.play(virtual_file.readframes(virtual_file.getnframes()))
+        if not os.path.exists(legacy_file_path):
+            return False
+
+        os.makedirs(os.path.dirname(cached_file_path), exist_ok=True)
+        os.replace(legacy_file_path, cached_file_path)
+
+        logger.debug(f"Migrated legacy cache file {legacy_file_path}")
+
+        return True
+
+    def _is_cached(self, text: str, cached_file_path: str) -> bool:
+        if os.path.exists(cached_file_path):
+            return True
+
+        return self._migrate_legacy_cache_file(text, cached_file_path)
+
+    def _read_cached_frames(self, cached_file_path: str) -> bytes | memoryview:
+        """
+        Read the audio frames from a cached WAV file.
+
+        Cache files written by this class have a canonical 44-byte header, so
+        the frames can be sliced out of the file contents without parsing the
+        header with the wave module. The slice is a memoryview so that the
+        frames are not copied. Any other layout falls back to the wave module.
+        """
+        with open(cached_file_path, "rb") as cached_file:
+            wav_data = cached_file.read()
+
+        # Modification time marks when the file was last used, so that
+        # prune_cache() removes the least recently used files
+        os.utime(cached_file_path)
+
+        if (
+            wav_data[0:4] == b"RIFF"
+            and wav_data[8:16] == b"WAVEfmt "
+            and wav_data[36:40] == b"data"
+        ):
+            data_size = int.from_bytes(wav_data[40:44], "little")
+            return memoryview(wav_data)[44 : 44 + data_size]
+
+        with wave.open(io.BytesIO(wav_data), "rb") as wav_file:
+            return wav_file.readframes(wav_file.getnframes())
+
+    def _get_cached_frames(self, cached_file_path: str) -> bytes | memoryview | None:
+        with self._frames_cache_lock:
+            audio_frames = self._frames_cache.get(cached_file_path)
+
+            if audio_frames is not None:
+                self._frames_cache.move_to_end(cached_file_path)
+
+            return audio_frames
+
+    def _put_cached_frames(
+        self, cached_file_path: str, audio_frames: bytes | memoryview
+    ) -> None:
+        with self._frames_cache_lock:
+            self._frames_cache[cached_file_path] = audio_frames
+            self._frames_cache.move_to_end(cached_file_path)
+
+            while len(self._frames_cache) > self._max_cached_frames:
+                self._frames_cache.popitem(last=False)
+
+    def _cache_text(self, text: str, cached_file_path: str) -> None:
+        for _ in self._synthesize_to_cache(text, cached_file_path):
+            pass
+
+    def prepare_cache(self, texts: list[str]) -> int:
+        """
+        Synthesize any of the given texts that are not already cached so that
+        they can be spoken later without waiting for synthesis. Texts are
+        synthesized concurrently, one per pooled synthesizer.
+
+        Returns the number of texts that were synthesized.
+        """
+        missing = {}
+
+        for text in texts:
+            cached_file_path = self._get_cache_path(text)
+
+            if not self._is_cached(text, cached_file_path):
+                missing[cached_file_path] = text
+            else:
+                # Lines that are prepared in advance are always in use
+                os.utime(cached_file_path)
+
+        with ThreadPoolExecutor(max_workers=self._num_synthesizers) as cache_executor:
+            futures = [
+                cache_executor.submit(self._cache_text, text, cached_file_path)
+                for cached_file_path, text in missing.items()
+            ]
+
+        for future in futures:
+            if future.exception():
+                logger.error("Error preparing speech cache")
+                logger.exception(future.exception())
+
+        return len(missing)
+
+    def prune_cache(self, max_files: int) -> int:
+        """
+        Delete the least recently used cache files so that at most max_files
+        remain, to keep the cache from growing without limit. Temporary files
+        left behind by interrupted cache writes are deleted as well.
+
+        Returns the number of files that were deleted.
+        """
+        if not os.path.isdir(self._cache_dir):
+            return 0
+
+        # Files are stored in subdirectories, but legacy files are still at
+        # the top level until they are migrated
+        entries = []
+
+        for entry in os.scandir(self._cache_dir):
+            if entry.is_dir():
+                entries.extend(os.scandir(entry.path))
+            else:
+                entries.append(entry)
+
+        cached_files = []
+        num_deleted = 0
+
+        # Temporary files older than this cannot belong to a write that is
+        # still in progress
+        stale_time = time.time() - self.STALE_TEMP_FILE_AGE
+
+        for entry in entries:
+            mtime = entry.stat().st_mtime
+
+            if entry.name.endswith(".wav"):
+                cached_files.append((mtime, entry.path))
+            elif ".wav.tmp." in entry.name and mtime < stale_time:
+                os.remove(entry.path)
+                num_deleted += 1
+
+        if len(cached_files) <= max_files:
+            return num_deleted
+
+        cached_files.sort()
+        num_evicted = len(cached_files) - max_files
+
+        for _, cached_file_path in cached_files[:num_evicted]:
+            os.remove(cached_file_path)
+
+            with self._frames_cache_lock:
+                self._frames_cache.pop(cached_file_path, None)
+
+        return num_deleted + num_evicted
+
+    def speak_text(self, text: str, use_cache: bool = True) -> None:
+        if use_cache:
+            cached_file_path = self._get_cache_path(text)
+            audio_frames = self._get_cached_frames(cached_file_path)
+
+            if audio_frames is None:
+                if not self._is_cached(text, cached_file_path):
+                    self._player.play_chunks(
+                        self._read_ahead(
+                            self._synthesize_to_cache(text, cached_file_path)
+                        )
+                    )
+                    return
+
+                audio_frames = self._read_cached_frames(cached_file_path)
+                self._put_cached_frames(cached_file_path, audio_frames)
+
+            self._player.play(audio_frames)
+        else:
+            self._player.play_chunks(self._read_ahead(self._synthesize_stream(text)))
@@ -22,7 +22,7 @@
 
 import logging
 
-from azure.storage.blob import BlobServiceClient, ContentSettings
+from azure.storage.blob import BlobServiceClient, ContentSettings, ExponentialRetry
 
 from log_config import get_logger_name
 
@@ -31,11 +31,32 @@ logger = logging.getLogger(get_logger_name())
 
 class ArtistStorage:
     def __init__(
-        self, storage_key: str, storage_account: str, storage_container: str
+        self,
+        storage_key: str,
+        storage_account: str,
+        storage_container: str,
+        max_concurrency: int = 4,
+        max_attempts: int = 3,
+        initial_retry_delay: float = 0.5,
     ) -> None:
+        # Number of parallel connections used to upload blocks of large blobs
+        self._max_concurrency = max_concurrency
+
+        # Retries are left to the SDK, which only retries transient failures
+        # such as timeouts and server errors, and retries individual blocks
+        # rather than restarting the whole upload. Delay before the first
+        # retry is shortened from the SDK default of 15 seconds.
+        retry_policy = ExponentialRetry(
+            initial_backoff=initial_retry_delay,
+            increment_base=2,
+            retry_total=max_attempts - 1,
+            random_jitter_range=0,
+        )
+
         self._blob_service_client = BlobServiceClient(
             account_url=f"https://{storage_account}.blob.core.windows.net",
             credential=storage_key,
+            retry_policy=retry_policy,
         )
         self._blob_container_client = self._blob_service_client.get_container_client(
             container=storage_container
@@ -49,4 +70,8 @@ class ArtistStorage:
             data=data,
             overwrite=True,
             content_settings=content_settings,
+            max_concurrency=self._max_concurrency,
+            # Known length lets the SDK plan block uploads up front instead of
+            # reading the data to find its size
+            length=len(data),
         )
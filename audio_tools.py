@@ -20,9 +20,11 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import array
-from typing import Tuple
+import io
+from collections import deque
+from typing import Iterable, Tuple
 
+import numpy as np
 import pyaudio
 
 
@@ -31,11 +33,20 @@ class AudioPlayer:
     Audio player class for playing audio streams.
     """
 
+    # Number of frames written to the output stream at a time
+    CHUNK_FRAMES = 1024
+
     def __init__(
         self, sample_width: int = 2, channels: int = 2, rate: int = 44000
     ) -> None:
         self._pyaudio = pyaudio.PyAudio()
 
+        # Stream is kept open between calls and only started and stopped, so
+        # the audio device is not negotiated again every time. Parameters it
+        # was opened with are kept so that it can be reopened if they change.
+        self._stream: pyaudio.Stream | None = None
+        self._stream_params: tuple[int, int, int] | None = None
+
         self.sample_width = sample_width
         self.channels = channels
         self.rate = rate
@@ -48,19 +59,61 @@ class AudioPlayer:
     def sample_width(self, sample_width: int) -> None:
         self._audio_format = pyaudio.get_format_from_width(sample_width)
 
-    def play(self, audio_stream: bytes) -> None:
-        stream = self._pyaudio.open(
-            format=self._audio_format,
-            channels=self.channels,
-            rate=self.rate,
-            output=True,
+    def _get_stream(self) -> pyaudio.Stream:
+        stream_params = (self._audio_format, self.channels, self.rate)
+
+        if self._stream is None or stream_params != self._stream_params:
+            if self._stream is not None:
+                self._stream.close()
+
+            self._stream = self._pyaudio.open(
+                format=self._audio_format,
+                channels=self.channels,
+                rate=self.rate,
+                output=True,
+                start=False,
+            )
+            self._stream_params = stream_params
+
+        return self._stream
+
+    def play(self, audio_stream: bytes | memoryview) -> None:
+        """
+        Play audio that is already in memory.
+
+        Audio is written in chunks of CHUNK_FRAMES frames so that playback
+        starts with the first chunk rather than handing the whole clip to the
+        output stream at once. Chunks are views into the audio, so nothing is
+        copied.
+        """
+        audio_view = memoryview(audio_stream)
+        chunk_size = self.CHUNK_FRAMES * self.sample_width * self.channels
+
+        self.play_chunks(
+            audio_view[i : i + chunk_size]
+            for i in range(0, len(audio_view), chunk_size)
         )
 
-        stream.write(audio_stream)
-        stream.stop_stream()
-        stream.close()
+    def play_chunks(self, chunks: Iterable[bytes | memoryview]) -> None:
+        """
+        Play audio chunks as they become available, e.g., from a generator that
+        is still receiving audio from a network stream.
+        """
+        stream = self._get_stream()
+        stream.start_stream()
+
+        try:
+            for chunk in chunks:
+                stream.write(chunk)
+        finally:
+            # Stopping waits for buffered audio to finish playing
+            stream.stop_stream()
 
     def terminate(self) -> None:
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
         self._pyaudio.terminate()
 
 
@@ -74,6 +127,12 @@ class AudioRecorder:
     ) -> None:
         self._pyaudio = pyaudio.PyAudio()
 
+        # Stream is kept open between calls and only started and stopped, so
+        # the audio device is not negotiated again every time. Parameters it
+        # was opened with are kept so that it can be reopened if they change.
+        self._stream: pyaudio.Stream | None = None
+        self._stream_params: tuple[int, int, int] | None = None
+
         self.sample_width = sample_width
         self.channels = channels
         self.rate = rate
@@ -86,6 +145,24 @@ class AudioRecorder:
     def sample_width(self, sample_width: int) -> None:
         self._audio_format = pyaudio.get_format_from_width(sample_width)
 
+    def _get_stream(self) -> pyaudio.Stream:
+        stream_params = (self._audio_format, self.channels, self.rate)
+
+        if self._stream is None or stream_params != self._stream_params:
+            if self._stream is not None:
+                self._stream.close()
+
+            self._stream = self._pyaudio.open(
+                format=self._audio_format,
+                channels=self.channels,
+                rate=self.rate,
+                input=True,
+                start=False,
+            )
+            self._stream_params = stream_params
+
+        return self._stream
+
     def record(
         self,
         max_duration: int,
@@ -113,14 +190,16 @@ class AudioRecorder:
         TODO: Trim pre-audio silence
         """
 
-        stream = self._pyaudio.open(
-            format=self._audio_format,
-            channels=self.channels,
-            rate=self.rate,
-            input=True,
-        )
+        # Stream is stopped between recordings so that audio captured while
+        # not recording, e.g., speech being played, is not included
+        stream = self._get_stream()
+        stream.start_stream()
 
-        frames = []
+        # Recorded audio is written straight to the output buffer, except for
+        # the most recent chunks which are held back since they are trimmed
+        # off as trailing silence when recording ends
+        output = io.BytesIO()
+        tail: deque[bytes] = deque(maxlen=max_silent_frames)
         num_frames = 0
         silent_frames = 0
         silence_detected = False
@@ -131,9 +210,13 @@ class AudioRecorder:
         while (num_frames < max_frames) and not silence_detected:
             num_frames += 1
             data = stream.read(chunk_size)
-            data_array = array.array("h", data)
 
-            max_value = max(data_array)
+            # Samples are viewed in place rather than copied, and the peak is
+            # found in C rather than with a Python-level loop. Negative peaks
+            # count as well. Minimum is negated as a Python int since
+            # np.abs() would overflow on -32768.
+            samples = np.frombuffer(data, dtype=np.int16)
+            max_value = max(int(samples.max()), -int(samples.min()))
 
             if max_value < silence_threshold:
                 if was_silent:
@@ -143,7 +226,10 @@ class AudioRecorder:
                 silent_frames = 0
                 was_silent = False
 
-            frames.append(data)
+            if tail and len(tail) == tail.maxlen:
+                output.write(tail.popleft())
+
+            tail.append(data)
 
             if silent_frames > max_silent_frames:
                 silence_detected = True
@@ -154,9 +240,12 @@ class AudioRecorder:
             valid_audio = True
 
         stream.stop_stream()
-        stream.close()
 
-        return (b"".join(frames[:-max_silent_frames]), valid_audio)
+        return (output.getvalue(), valid_audio)
 
     def terminate(self) -> None:
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
         self._pyaudio.terminate()
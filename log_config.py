@@ -20,30 +20,183 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import atexit
 import logging
+import os
+import time
+from logging.handlers import QueueHandler, QueueListener
+from queue import Queue
 
 LOGGER_NAME = "ai-artist"
 
+# Environment variable that overrides the level passed to
+# create_global_logger(), e.g., AI_ARTIST_LOG_LEVEL=WARNING
+LOG_LEVEL_ENV_VAR = "AI_ARTIST_LOG_LEVEL"
+
+
+class CachedTimeFormatter(logging.Formatter):
+    """
+    Formatter that formats the date and time of each second only once rather
+    than calling strftime() for every record, since many records are usually
+    logged within the same second. Only the milliseconds are added to each
+    record.
+
+    Output is the same as logging.Formatter when no date format is given.
+    """
+
+    def __init__(self, fmt: str) -> None:
+        super().__init__(fmt)
+
+        # Second and its formatted time are stored together so that a record
+        # formatted on another thread never sees one without the other
+        self._cached_time: tuple[int, str] = (-1, "")
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str | None = None) -> str:
+        if datefmt:
+            return super().formatTime(record, datefmt)
+
+        second = int(record.created)
+        cached_second, formatted_time = self._cached_time
+
+        if second != cached_second:
+            formatted_time = time.strftime(
+                self.default_time_format, self.converter(record.created)
+            )
+            self._cached_time = (second, formatted_time)
+
+        return self.default_msec_format % (formatted_time, record.msecs)
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """
+    File handler that lets records collect in a large write buffer rather
+    than flushing the file after every record, so that bursts of logging
+    turn into a few large writes.
+
+    Records at or above flush_level are still flushed immediately so that
+    errors reach the file even if the process is killed. Everything else is
+    written when the buffer fills or the handler is closed at exit.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        buffer_size: int = 65536,
+        flush_level: int = logging.WARNING,
+    ) -> None:
+        # Must be set first since the file is opened by the base class
+        self._buffer_size = buffer_size
+        self._flush_level = flush_level
+        self._flush_needed = False
+
+        super().__init__(filename)
+
+    def _open(self):
+        return open(
+            self.baseFilename,
+            self.mode,
+            buffering=self._buffer_size,
+            encoding=self.encoding,
+            errors=self.errors,
+        )
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # Base class calls flush() after writing each record
+        self._flush_needed = record.levelno >= self._flush_level
+        super().emit(record)
+        self._flush_needed = True
+
+    def flush(self) -> None:
+        if self._flush_needed:
+            super().flush()
+
 
 def create_global_logger(log_file_path: str, log_level) -> logging.Logger:
+    """
+    Create the logger shared by all modules.
+
+    Records are put on a queue and formatted and written by a listener on a
+    background thread, so logging never waits for the disk or console. The
+    listener is stopped at exit so that queued records are written first.
+
+    Calling this again returns the existing logger rather than adding another
+    set of handlers, which would write every record more than once.
+
+    If the AI_ARTIST_LOG_LEVEL environment variable is set, its level name or
+    number is used instead of log_level.
+    """
     logger = logging.getLogger(LOGGER_NAME)
 
+    if logger.handlers:
+        return logger
+
+    env_log_level = os.environ.get(LOG_LEVEL_ENV_VAR, "").strip()
+    invalid_env_log_level = False
+
+    if env_log_level:
+        if env_log_level.isdigit():
+            log_level = int(env_log_level)
+        else:
+            # Known level names map to their number, anything else maps to a
+            # string. An invalid value must not stop the program from starting,
+            # so the level passed in is kept instead.
+            named_level = logging.getLevelName(env_log_level.upper())
+
+            if isinstance(named_level, int):
+                log_level = named_level
+            else:
+                invalid_env_log_level = True
+
     logger.setLevel(log_level)
 
-    file_handler = logging.FileHandler(log_file_path)
-    file_handler.setLevel(log_level)
+    # Unless debugging, skip collecting record attributes that are not in the
+    # log format. Finding the source file and line of each record walks the
+    # stack, which is the most expensive part of creating a record.
+    if not logger.isEnabledFor(logging.DEBUG):
+        logging.logThreads = False
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
+        logging._srcfile = None
+
+    # Records are only written by this logger's own handlers, not passed on
+    # to any handlers of the root logger as well
+    logger.propagate = False
+
+    file_handler = BufferedFileHandler(log_file_path)
 
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(log_level)
 
-    formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)-8s - %(message)s"
+    # Log file is read by tools rather than people, so records are stamped
+    # with the raw epoch time and no date formatting is needed. Readable
+    # times are only used when someone is watching the console.
+    file_formatter = logging.Formatter(
+        "%(created).3f - %(name)s - %(levelname)-8s - %(message)s"
+    )
+
+    if console_handler.stream.isatty():
+        console_formatter = CachedTimeFormatter(
+            "%(asctime)s - %(name)s - %(levelname)-8s - %(message)s"
+        )
+    else:
+        console_formatter = file_formatter
+
+    file_handler.setFormatter(file_formatter)
+    console_handler.setFormatter(console_formatter)
+
+    log_queue: Queue = Queue()
+
+    # Handlers have no level of their own, so the logger's level is the only
+    # filter and changing it never drops records that are already queued
+    listener = QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
     )
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger.addHandler(QueueHandler(log_queue))
 
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    if invalid_env_log_level:
+        logger.warning(f"Ignoring invalid {LOG_LEVEL_ENV_VAR} value: {env_log_level}")
 
     return logger
 
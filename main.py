@@ -34,42 +34,65 @@ Uses Azure Speech API to convert text to speech.
 Uses Azure Blob Storage to store downloadable images.
 """
 
+import base64
+import collections
 import datetime
 import io
 import json
 import logging
 import os
 import random
-import string
+import re
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from enum import Enum
 from typing import Union
 
 import pygame
 import qrcode
 from azure.storage.blob import BlobServiceClient, ContentSettings
+from openai import OpenAI
 from pygame.locals import *
 
 from artist_classes import (
+    BLACK,
+    WHITE,
+    YELLOW,
     ArtistCanvas,
     ArtistCreation,
     DallE2Creator,
     DallE3Creator,
+    ImageCache,
     SDXLCreator,
     StableImageCreator,
     StatusScreen,
+    get_font,
 )
+from artist_config import ArtistConfig
 from artist_moderator import ArtistModerator
 from artist_speech import ArtistSpeech
 from artist_storage import ArtistStorage
 from audio_tools import AudioRecorder
 from log_config import create_global_logger
 from openai_tools import ChatCharacter, Transcriber
+from response_cache import ResponseCache
 
 
 # Global logger object to avoid passing logger to many functions
 logger = create_global_logger("artist.log", logging.DEBUG)
 
+# Global executors so that worker threads are reused across creations.
+# Creation work (speech, image and verse) has its own pool so that it never
+# queues behind slow or retrying uploads and file writes on io_executor.
+executor = ThreadPoolExecutor(max_workers=4)
+io_executor = ThreadPoolExecutor(max_workers=4)
+
+# First number in the critic's verdict is taken as the chosen poem
+POEM_NUMBER_PATTERN = re.compile(r"\d+")
+
+# Placeholders in the HTML template, e.g., ***PROMPT***
+TEMPLATE_PLACEHOLDER_PATTERN = re.compile(r"\*\*\*(IMG-URL|PROMPT|GEN-BY|TIME)\*\*\*")
+
 
 class ButtonConfig:
     """
@@ -93,6 +116,16 @@ class ButtonConfig:
         self.shutdown_hold_button = shutdown_hold_button
         self.shutdown_press_button = shutdown_press_button
 
+        # Buttons and the user actions they trigger. Shutdown is not included
+        # since it requires two buttons. If the same button is configured for
+        # more than one action, the action inserted last takes priority.
+        self.button_actions = {
+            reveal_qr_button: UserAction.SHOW_QR,
+            reveal_prompt_button: UserAction.SHOW_PROMPT,
+            daydream_button: UserAction.DAYDREAM,
+            generate_button: UserAction.NEW,
+        }
+
 
 class UserAction(Enum):
     """
@@ -107,6 +140,28 @@ class UserAction(Enum):
     PREVIOUS_RECENT = 6
     NEXT_RECENT = 7
     AUTO_DAYDREAM = 8
+    CHECK_DAYDREAM = 9
+    UPDATE_DAYDREAM_GATE = 10
+
+
+# Keyboard keys and the user actions they trigger
+KEY_ACTIONS = {
+    K_ESCAPE: UserAction.QUIT,
+    K_SPACE: UserAction.NEW,
+    K_d: UserAction.DAYDREAM,
+    K_p: UserAction.SHOW_PROMPT,
+    K_q: UserAction.SHOW_QR,
+    K_RIGHT: UserAction.NEXT_RECENT,
+    K_LEFT: UserAction.PREVIOUS_RECENT,
+}
+
+# Timer event used to periodically check whether automatic daydreams are allowed
+# at the current time of day and day of week
+DAYDREAM_GATE_EVENT = pygame.USEREVENT + 1
+
+# Content surface most recently shown with update_display(), used to tell
+# whether the status screen only needs a partial update
+displayed_surface: Union[pygame.Surface, None] = None
 
 
 def init_display(width: int, height: int) -> pygame.Surface:
@@ -120,7 +175,7 @@ def init_display(width: int, height: int) -> pygame.Surface:
 
     surface = pygame.display.set_mode((width, height), pygame.FULLSCREEN)
 
-    surface.fill(pygame.Color("black"))
+    surface.fill(BLACK)
 
     pygame.display.update()
 
@@ -150,55 +205,75 @@ def init_joystick() -> Union[pygame.joystick.JoystickType, None]:
 def check_for_event(
     js: Union[pygame.joystick.JoystickType, None],
     button_config: ButtonConfig,
+    timeout: int,
 ) -> Union[UserAction, None]:
     """
-    Check for events and return a string representing the event if one is found.
+    Wait up to timeout milliseconds for an event, or indefinitely if timeout is
+    0, and return the user action corresponding to the event, if any. Returns
+    UserAction.CHECK_DAYDREAM if the timeout expired without an event.
+
+    Waiting for events rather than polling allows the CPU to idle between events.
     """
-    for event in pygame.event.get():
-        if event.type == pygame.KEYDOWN:
-            if event.key == K_ESCAPE:
+    event = pygame.event.wait(timeout)
+
+    if event.type == pygame.NOEVENT:
+        return UserAction.CHECK_DAYDREAM
+
+    return classify_event(event=event, js=js, button_config=button_config)
+
+
+def classify_event(
+    event: pygame.event.Event,
+    js: Union[pygame.joystick.JoystickType, None],
+    button_config: ButtonConfig,
+) -> Union[UserAction, None]:
+    """
+    Return the user action corresponding to an event, if any.
+    """
+    if event.type == DAYDREAM_GATE_EVENT:
+        return UserAction.UPDATE_DAYDREAM_GATE
+    elif event.type == pygame.KEYDOWN:
+        return KEY_ACTIONS.get(event.key)
+    elif js and event.type == pygame.JOYBUTTONDOWN:
+        if event.button == button_config.shutdown_press_button:
+            if js.get_button(button_config.shutdown_hold_button):
                 return UserAction.QUIT
-            if event.key == K_SPACE:
-                return UserAction.NEW
-            if event.key == K_d:
-                return UserAction.DAYDREAM
-            if event.key == K_p:
-                return UserAction.SHOW_PROMPT
-            if event.key == K_q:
-                return UserAction.SHOW_QR
-            if event.key == K_RIGHT:
-                return UserAction.NEXT_RECENT
-            if event.key == K_LEFT:
-                return UserAction.PREVIOUS_RECENT
-        elif js and event.type == pygame.JOYBUTTONDOWN:
-            if event.button == button_config.shutdown_press_button:
-                if js.get_button(button_config.shutdown_hold_button):
-                    return UserAction.QUIT
-            if event.button == button_config.generate_button:
-                return UserAction.NEW
-            if event.button == button_config.daydream_button:
-                return UserAction.DAYDREAM
-            if event.button == button_config.reveal_prompt_button:
-                return UserAction.SHOW_PROMPT
-            if event.button == button_config.reveal_qr_button:
-                return UserAction.SHOW_QR
-        elif js and event.type == pygame.JOYAXISMOTION:
-            if event.axis == 0 and event.value < -0.5:
-                return UserAction.PREVIOUS_RECENT
-            if event.axis == 0 and event.value > 0.5:
-                return UserAction.NEXT_RECENT
+        return button_config.button_actions.get(event.button)
+    elif js and event.type == pygame.JOYAXISMOTION:
+        if event.axis == 0 and event.value < -0.5:
+            return UserAction.PREVIOUS_RECENT
+        if event.axis == 0 and event.value > 0.5:
+            return UserAction.NEXT_RECENT
 
     return None
 
 
+def is_daydream_time(
+    start_hour: int, end_hour: int, iso_weekdays: tuple[int, ...]
+) -> bool:
+    """
+    Check whether automatic daydreams are allowed at the current time of day
+    and day of week.
+    """
+    time_now = datetime.datetime.now()
+
+    return (
+        time_now.hour >= start_hour
+        and time_now.hour < end_hour
+        and time_now.isoweekday() in iso_weekdays
+    )
+
+
 def get_random_string(length: int) -> str:
     """
     Generate a random string of lowercase letters and digits.
 
-    Used for generating unique filenames.
+    Used for generating unique filenames. Random bytes are base32 encoded,
+    which gives the letters a-z and digits 2-7 without picking each
+    character individually.
     """
-    chars = string.ascii_lowercase + string.digits
-    return "".join(random.choices(chars, k=length))
+    random_bytes = os.urandom((length * 5 + 7) // 8)
+    return base64.b32encode(random_bytes).decode("ascii").lower()[:length]
 
 
 def get_one_verse(
@@ -211,10 +286,10 @@ def get_one_verse(
     """
 
     # Poet is a single-turn character so no history is needed
-    poet.reset()
-
     try:
-        verse = poet.get_chat_response(base_prompt + " " + user_prompt).content
+        verse = poet.get_chat_response(
+            base_prompt + " " + user_prompt, one_shot=True
+        ).content
     except Exception as e:
         logger.error(f"Error getting verse from poet")
         logger.exception(e)
@@ -235,17 +310,37 @@ def get_best_verse(
     to choose the best verse.
     """
 
-    verses: list[str] = []
+    # Poet is a single-turn character so no history is needed. All verses are
+    # generated as separate choices of a single request so the prompt is only
+    # sent once.
+    try:
+        verses = poet.get_chat_response(
+            base_prompt + " " + user_prompt, n=num_verses, one_shot=True
+        ).contents
+    except Exception as e:
+        logger.error(f"Error getting verses from poet")
+        logger.exception(e)
+        raise
+
+    # Not every model honors n, so any missing verses are requested separately,
+    # all at the same time. One-shot requests leave the poet unchanged, so they
+    # can share it.
+    num_missing = num_verses - len(verses)
 
-    for _ in range(num_verses):
-        verse = get_one_verse(
-            poet=poet, base_prompt=base_prompt, user_prompt=user_prompt
+    if num_missing > 0:
+        logger.warning(
+            f"Poet returned {len(verses)} of {num_verses} verses - requesting the rest"
         )
 
-        verses.append(verse)
-
-    # Critic is a single-turn character so no history is needed
-    critic.reset()
+        with ThreadPoolExecutor(max_workers=num_missing) as verse_executor:
+            verses.extend(
+                verse_executor.map(
+                    lambda _: get_one_verse(
+                        poet=poet, base_prompt=base_prompt, user_prompt=user_prompt
+                    ),
+                    range(num_missing),
+                )
+            )
 
     critic_message = f"Theme: {user_prompt}\n"
 
@@ -258,28 +353,79 @@ def get_best_verse(
     chosen_poem = None
 
     try:
-        critic_verdict = critic.get_chat_response(critic_message).content
+        # Critic is a single-turn character so no history is needed
+        critic_verdict = critic.get_chat_response(critic_message, one_shot=True).content
         logger.info(f"Critic verdict: {critic_verdict}")
 
-        for c in critic_verdict:
-            if c.isdigit():
-                chosen_poem = int(c)
-                logger.debug(f"Chosen poem number: {chosen_poem}")
-                break
+        poem_number_match = POEM_NUMBER_PATTERN.search(critic_verdict)
+
+        if poem_number_match:
+            chosen_poem = int(poem_number_match.group())
+            logger.debug(f"Chosen poem number: {chosen_poem}")
     except Exception as e:
         logger.error(f"Error getting verdict from critic")
         logger.exception(e)
         raise
 
-    if chosen_poem is not None:  # Maybe there could be an index 0 someday?
+    if chosen_poem is not None and 1 <= chosen_poem <= len(verses):
         return verses[chosen_poem - 1]
     else:
         logger.warning(
-            f"No poem number found in critic verdict - returning random verse"
+            f"No valid poem number found in critic verdict - returning random verse"
         )
         return random.choice(verses)
 
 
+def wrap_text(text: str, font: pygame.font.Font, max_width: int) -> list[str]:
+    """
+    Split text into lines that fit within max_width pixels when rendered
+    with font.
+
+    Each distinct word is measured once and line widths are built up from
+    the word widths, so growing lines do not need to be re-measured.
+    """
+    words = text.split()
+    word_widths = {word: font.size(word + " ")[0] for word in set(words)}
+
+    lines = []
+    line = ""
+    line_width = 0
+
+    for word in words:
+        if line and line_width + word_widths[word] > max_width:
+            lines.append(line)
+
+            line = ""
+            line_width = 0
+
+        line += word + " "
+        line_width += word_widths[word]
+
+    if line.strip():
+        lines.append(line)
+
+    return lines
+
+
+def generate_image(
+    painter: Union[DallE2Creator, DallE3Creator, SDXLCreator, StableImageCreator],
+    prompt: str,
+) -> pygame.Surface:
+    """
+    Generate an image and decode it into a surface.
+
+    Runs on a worker thread so that image decoding happens alongside verse
+    generation rather than on the main thread afterward. The image is also
+    converted to the display pixel format so that blitting it is a straight
+    copy.
+    """
+    img_bytes = painter.generate_image_data(prompt=prompt)
+
+    # raw_image.png is a name hint to assist in file format detection, not
+    # an actual file on disk
+    return pygame.image.load(io.BytesIO(img_bytes), "raw_image.png").convert()
+
+
 def get_prompt_surface(
     prompt: str,
     prompt_source: str,
@@ -293,61 +439,42 @@ def get_prompt_surface(
     Get a surface with the prompt text and prompt source rendered on it.
     """
     prompt_surface = pygame.Surface((width, height))
-    prompt_surface.fill(pygame.Color("yellow"))
+    prompt_surface.fill(YELLOW)
 
     text_surface = pygame.Surface(
         (width - (margin_size * 2), height - (margin_size * 2))
     )
-    text_surface.fill(pygame.Color("black"))
+    text_surface.fill(BLACK)
 
     text_subsurface = pygame.Surface(
         (width - (margin_size * 4), height - (margin_size * 4))
     )
-    text_subsurface.fill(pygame.Color("black"))
+    text_subsurface.fill(BLACK)
 
     prompt = "Prompt: " + prompt
     prompt_source = "Source: " + prompt_source
 
-    font = pygame.font.SysFont(font_name, font_size)
+    font = get_font(font_name, font_size)
 
-    prompt_words = prompt.split()
+    line_height = font.get_height()
 
-    line = ""
-    y_pos = 0
-
-    total_height = 0
-
-    for word in prompt_words:
-        previous_line = line
-        line += word + " "
-
-        line_width = font.size(line)[0]
-        line_height = font.size(line)[1]
-
-        if line_width > width - (margin_size * 8):
-            line_surface = font.render(previous_line, True, pygame.Color("white"))
-            logger.debug(f"Rendering word-wrapped prompt line: {previous_line}")
-            text_subsurface.blit(line_surface, (margin_size, y_pos))
+    prompt_lines = wrap_text(
+        text=prompt, font=font, max_width=width - (margin_size * 8)
+    )
 
-            line = word + " "
-            y_pos += line_height
-            total_height += line_height
+    # Prompt lines, a blank line, and the prompt source line
+    total_height = (len(prompt_lines) + 2) * line_height
 
-    # Render any remaining words
-    if line.strip():
-        line_surface = font.render(line, True, pygame.Color("white"))
+    for line_num, line in enumerate(prompt_lines):
+        line_surface = font.render(line, True, WHITE)
         logger.debug(f"Rendering prompt line: {line}")
-        text_subsurface.blit(line_surface, (margin_size, y_pos))
-        total_height += line_height
-
-    # Leave blank line before prompt source
-    y_pos += line_height * 2
-    total_height += line_height
+        text_subsurface.blit(line_surface, (margin_size, line_num * line_height))
 
-    line_surface = font.render(prompt_source, True, pygame.Color("white"))
-    total_height += line_height
+    line_surface = font.render(prompt_source, True, WHITE)
     logger.debug(f"Rendering prompt source line: {prompt_source}")
-    text_subsurface.blit(line_surface, (margin_size, y_pos))
+    text_subsurface.blit(
+        line_surface, (margin_size, (len(prompt_lines) + 1) * line_height)
+    )
 
     text_surface.blit(
         text_subsurface,
@@ -356,7 +483,41 @@ def get_prompt_surface(
 
     prompt_surface.blit(text_surface, (margin_size, margin_size))
 
-    return prompt_surface
+    # Convert to display pixel format so that blitting does not need to convert
+    return prompt_surface.convert()
+
+
+def get_qr_surface(url: str, box_size: int = 10, border: int = 4) -> pygame.Surface:
+    """
+    Get a surface with a QR code for the URL drawn on it.
+
+    The QR code modules are drawn directly onto the surface rather than
+    generating an image, saving it as PNG, and loading the PNG into pygame.
+    """
+    qr = qrcode.QRCode(
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=box_size,
+        border=border,
+    )
+    qr.add_data(url)
+    qr.make(fit=True)
+
+    # Matrix includes the border
+    qr_matrix = qr.get_matrix()
+
+    qr_surface = pygame.Surface((len(qr_matrix) * box_size, len(qr_matrix) * box_size))
+    qr_surface.fill(WHITE)
+
+    for y, row in enumerate(qr_matrix):
+        for x, is_dark in enumerate(row):
+            if is_dark:
+                qr_surface.fill(
+                    BLACK,
+                    (x * box_size, y * box_size, box_size, box_size),
+                )
+
+    # Convert to display pixel format so that blitting does not need to convert
+    return qr_surface.convert()
 
 
 def show_status_screen(
@@ -364,20 +525,36 @@ def show_status_screen(
 ) -> None:
     """
     Show a status screen with a message.
+
+    If the status screen is already on the display, only the area covered by
+    the old and new messages is updated.
     """
-    status_screen_obj.render_status(text)
+    dirty_rect = status_screen_obj.render_status(text)
 
-    update_display(surface, status_screen_obj.surface)
+    update_display(surface, status_screen_obj.surface, dirty_rect)
 
 
 def update_display(
-    display_surface: pygame.Surface, content_surface: pygame.Surface
+    display_surface: pygame.Surface,
+    content_surface: pygame.Surface,
+    rect: Union[pygame.Rect, None] = None,
 ) -> None:
     """
     Update the display with the content surface.
+
+    If rect is given and the content surface is already on the display, only
+    that area is copied and updated. Otherwise the whole display is updated.
     """
-    display_surface.blit(content_surface, (0, 0))
-    pygame.display.update()
+    global displayed_surface
+
+    if rect is not None and displayed_surface is content_surface:
+        display_surface.blit(content_surface, rect, rect)
+        pygame.display.update(rect)
+    else:
+        display_surface.blit(content_surface, (0, 0))
+        pygame.display.update()
+
+    displayed_surface = content_surface
 
 
 def load_recents(recents_file_name: str) -> list:
@@ -399,20 +576,76 @@ def save_recents(recents: list, recents_file_name: str) -> None:
         json.dump(recents, recents_file, indent=4)
 
 
+def write_file(file_name: str, data: bytes) -> None:
+    with open(file_name, "wb") as f:
+        f.write(data)
+
+
+def encode_screenshot(screenshot: pygame.Surface, name_hint: str) -> bytes:
+    """
+    Encode a screenshot as PNG in memory so that the same bytes can be both
+    written to disk and uploaded.
+
+    Runs on a worker thread, so the screenshot must be a surface that the main
+    thread will not change, e.g., a copy of the display surface. name_hint
+    selects the image format and is not written to.
+    """
+    screenshot_data = io.BytesIO()
+    pygame.image.save(screenshot, screenshot_data, name_hint)
+
+    return screenshot_data.getvalue()
+
+
+def write_encoded_file(file_name: str, data_future: Future) -> None:
+    """
+    Write data to a file once the task producing it has finished.
+    """
+    write_file(file_name, data_future.result())
+
+
+def upload_encoded_blob(
+    storage: ArtistStorage, blob_name: str, data_future: Future, content_type: str
+) -> None:
+    """
+    Upload data once the task producing it has finished.
+    """
+    storage.upload_blob(
+        blob_name=blob_name, data=data_future.result(), content_type=content_type
+    )
+
+
+def wait_for_tasks(task_futures: dict) -> None:
+    """
+    Wait for tasks running in the background to finish, logging any that
+    failed, and clear the dictionary of pending tasks.
+
+    Dictionary maps each future to a description of its task that is used
+    in the error message, e.g., "uploading HTML".
+    """
+    wait(task_futures)
+
+    for task_future, task_description in task_futures.items():
+        if task_future.exception():
+            logger.error(f"Error {task_description}")
+            logger.exception(task_future.exception())
+
+    task_futures.clear()
+
+
 def main() -> None:
     try:
         with open("config.json", "r") as config_file:
-            config = json.load(config_file)
+            config = ArtistConfig.from_dict(json.load(config_file))
     except FileNotFoundError:
         print("Please create a config.json file.")
         return
 
-    image_model = config["image_model"]
+    image_model = config.image_model
 
     if image_model == "stableimage":
-        stable_image_model = config["stableimage_model"]
+        stable_image_model = config.stableimage_model
         # sd3_model must be specified in the config file even if using core/ultra
-        sd3_model = config["sd3_model"]
+        sd3_model = config.sd3_model
     try:
         openai_api_key = os.environ["OPENAI_API_KEY"]
     except KeyError:
@@ -443,45 +676,75 @@ def main() -> None:
     # In general, configuration items that are referenced multiple times are
     # initialized here. Items that are used only once are usually referenced directly
     # where they are used.
-    output_dir = config["output_dir"]
+    output_dir = config.output_dir
 
-    recents_file_name = config["recents_file_name"]
+    recents_file_name = config.recents_file_name
 
-    storage_account = config["storage_account"]
-    storage_container = config["storage_container"]
+    storage_account = config.storage_account
+    storage_container = config.storage_container
 
-    input_sample_rate = config["input_sample_rate"]
+    input_sample_rate = config.input_sample_rate
 
-    max_recording_time = config["max_recording_time"]
+    max_recording_time = config.max_recording_time
 
-    img_width = config["img_width"]
-    img_height = config["img_height"]
+    img_width = config.img_width
+    img_height = config.img_height
 
-    display_width = config["display_width"]
-    display_height = config["display_height"]
+    display_width = config.display_width
+    display_height = config.display_height
 
-    horiz_margin = config["horiz_margin"]
-    vert_margin = config["vert_margin"]
+    horiz_margin = config.horiz_margin
+    vert_margin = config.vert_margin
 
     button_config = ButtonConfig(
-        generate_button=config["generate_button"],
-        daydream_button=config["daydream_button"],
-        reveal_qr_button=config["reveal_qr_button"],
-        reveal_prompt_button=config["reveal_prompt_button"],
-        shutdown_hold_button=config["shutdown_hold_button"],
-        shutdown_press_button=config["shutdown_press_button"],
+        generate_button=config.generate_button,
+        daydream_button=config.daydream_button,
+        reveal_qr_button=config.reveal_qr_button,
+        reveal_prompt_button=config.reveal_prompt_button,
+        shutdown_hold_button=config.shutdown_hold_button,
+        shutdown_press_button=config.shutdown_press_button,
     )
 
-    num_verses = config["num_verses"]
+    num_verses = config.num_verses
 
     # Critic is recommended for best results, but can be disabled to save tokens when
     # using GPT-4 chat completion API
-    use_critic = config["use_critic"]
+    use_critic = config.use_critic
+
+    min_daydream_time = config.min_daydream_time * 60  # Convert to seconds
+    max_daydream_time = config.max_daydream_time * 60  # Convert to seconds
+
+    manual_daydream_window = config.manual_daydream_window * 60  # Convert to seconds
+
+    # Items used on every pass through the main loop are bound here as well so
+    # that they are local variable loads rather than attribute lookups
+    welcome_words = config.welcome_words
+    welcome_lines = config.welcome_lines
+    working_lines = config.working_lines
+    finished_lines = config.finished_lines
+    failed_lines = config.failed_lines
+    daydream_lines = config.daydream_lines
+    daydream_refusal_lines = config.daydream_refusal_lines
+
+    daydream_start_hour = config.daydream_start_hour
+    daydream_end_hour = config.daydream_end_hour
+    daydream_iso_weekdays = config.daydream_iso_weekdays
 
-    min_daydream_time = config["min_daydream_time"] * 60  # Convert to seconds
-    max_daydream_time = config["max_daydream_time"] * 60  # Convert to seconds
+    manual_daydream_limit = config.manual_daydream_limit
 
-    manual_daydream_window = config["manual_daydream_window"] * 60  # Convert to seconds
+    prompt_font = config.prompt_font
+    prompt_font_size = config.prompt_font_size
+    prompt_display_time = config.prompt_display_time
+
+    qr_display_time = config.qr_display_time
+
+    artist_base_prompt = config.artist_base_prompt
+    verse_base_prompt = config.verse_base_prompt
+    image_base_prompts = config.image_base_prompts
+
+    file_name_length = config.file_name_length
+
+    max_recents = config.max_recents
 
     random.seed()
 
@@ -495,36 +758,45 @@ def main() -> None:
     speech_svc = ArtistSpeech(
         subscription_key=azure_speech_key,
         region=azure_speech_region,
-        language=config["speech_language"],
-        gender=config["speech_gender"],
-        voice=config["speech_voice"],
-        cache_dir=config["speech_cache_dir"],
+        language=config.speech_language,
+        gender=config.speech_gender,
+        voice=config.speech_voice,
+        cache_dir=config.speech_cache_dir,
     )
+    speech_svc.warm_up()
 
     logger.debug("Initializing storage...")
     storage = ArtistStorage(
         storage_key=azure_storage_key,
-        storage_account=config["storage_account"],
-        storage_container=config["storage_container"],
+        storage_account=config.storage_account,
+        storage_container=config.storage_container,
+        max_concurrency=config.storage_max_concurrency,
     )
 
     logger.debug("Initializing audio recorder...")
     audio_recorder = AudioRecorder(sample_width=2, channels=1, rate=input_sample_rate)
 
+    # A single client is shared by all OpenAI-based components so that they
+    # share one HTTP connection pool
+    logger.debug("Initializing OpenAI client...")
+    openai_client = OpenAI(api_key=openai_api_key)
+
     logger.debug("Initializing transcriber...")
     transcriber = Transcriber(
         channels=1,
         sample_width=2,
         framerate=input_sample_rate,
-        model=config["transcriber_model"],
+        model=config.transcriber_model,
         api_key=openai_api_key,
+        openai_client=openai_client,
     )
 
     logger.debug("Initialzing autonomous AI artist...")
     ai_artist = ChatCharacter(
-        system_prompt=config["artist_system_prompt"],
-        model=config["artist_chat_model"],
+        system_prompt=config.artist_system_prompt,
+        model=config.artist_chat_model,
         api_key=openai_api_key,
+        openai_client=openai_client,
     )
 
     logger.debug(f"Initializing painter with image model {image_model}...")
@@ -533,21 +805,23 @@ def main() -> None:
             api_key=stability_ai_api_key,
             img_width=img_width,
             img_height=img_height,
-            steps=config["sdxl_steps"],
-            cfg_scale=config["sdxl_cfg_scale"],
+            steps=config.sdxl_steps,
+            cfg_scale=config.sdxl_cfg_scale,
         )
     elif image_model == "dalle2":
         painter = DallE2Creator(
             api_key=openai_api_key,
+            openai_client=openai_client,
             img_width=img_width,
             img_height=img_height,
         )
     elif image_model == "dalle3":
         painter = DallE3Creator(
             api_key=openai_api_key,
+            openai_client=openai_client,
             img_width=img_width,
             img_height=img_height,
-            quality=config["dalle3_quality"],
+            quality=config.dalle3_quality,
         )
     elif image_model == "stableimage":
         painter = StableImageCreator(
@@ -561,24 +835,31 @@ def main() -> None:
 
     logger.debug("Initializing poet...")
     poet = ChatCharacter(
-        system_prompt=config["poet_system_prompt"],
-        model=config["poet_chat_model"],
+        system_prompt=config.poet_system_prompt,
+        model=config.poet_chat_model,
         api_key=openai_api_key,
-        temperature=config["poet_temperature"],
-        presence_penalty=config["poet_presence_penalty"],
-        frequency_penalty=config["poet_frequency_penalty"],
+        openai_client=openai_client,
+        temperature=config.poet_temperature,
+        presence_penalty=config.poet_presence_penalty,
+        frequency_penalty=config.poet_frequency_penalty,
     )
 
     if use_critic:
         logger.debug("Initializing critic...")
         critic = ChatCharacter(
-            system_prompt=config["critic_system_prompt"],
-            model=config["critic_chat_model"],
+            system_prompt=config.critic_system_prompt,
+            model=config.critic_chat_model,
             api_key=openai_api_key,
+            openai_client=openai_client,
         )
 
+    logger.debug("Initializing response cache...")
+    response_cache = ResponseCache(db_path=config.response_cache_file)
+
     logger.debug("Initializing moderator...")
-    moderator = ArtistModerator(api_key=openai_api_key)
+    moderator = ArtistModerator(
+        api_key=openai_api_key, cache=response_cache, openai_client=openai_client
+    )
 
     logger.debug("Initializing artist canvas...")
     artist_canvas = ArtistCanvas(
@@ -586,34 +867,87 @@ def main() -> None:
         height=display_height,
         horiz_margin=horiz_margin,
         vert_margin=vert_margin,
-        verse_font_name=config["verse_font"],
-        verse_font_max_size=config["verse_font_size"],
-        verse_line_spacing=config["verse_line_spacing"],
+        verse_font_name=config.verse_font,
+        verse_font_max_size=config.verse_font_size,
+        verse_line_spacing=config.verse_line_spacing,
     )
 
     logger.debug("Initializing status screen...")
     status_screen = StatusScreen(
         width=display_width,
         height=display_height,
-        font_name=config["status_font"],
-        heading1_size=config["status_heading1_size"],
-        heading2_size=config["status_heading2_size"],
-        status_size=config["status_status_size"],
+        font_name=config.status_font,
+        heading1_size=config.status_heading1_size,
+        heading2_size=config.status_heading2_size,
+        status_size=config.status_status_size,
         vert_margin=vert_margin,
     )
 
+    show_status_screen(
+        surface=disp_surface, text="Preparing...", status_screen_obj=status_screen
+    )
+
+    logger.debug("Preparing speech cache...")
+    cached_lines = [
+        f"{welcome_word} {welcome_line}"
+        for welcome_word in welcome_words
+        for welcome_line in welcome_lines
+    ]
+
+    for lines in [
+        working_lines,
+        finished_lines,
+        failed_lines,
+        daydream_lines,
+        daydream_refusal_lines,
+    ]:
+        cached_lines.extend(lines)
+
+    num_synthesized = speech_svc.prepare_cache(cached_lines)
+    logger.debug(f"Synthesized {num_synthesized} uncached speech lines")
+
+    # Pruning runs after the cache is prepared so that the prepared lines
+    # count as recently used and are kept
+    if config.speech_cache_max_files is not None:
+        num_pruned = speech_svc.prune_cache(config.speech_cache_max_files)
+        logger.debug(f"Pruned {num_pruned} speech cache files")
+
+    # Template does not change while running, so it only needs to be read once
+    logger.debug("Loading HTML template...")
+    with open(config.html_template, "r") as template_file:
+        html_template = template_file.read()
+
     logger.debug("Loading recent creations...")
-    recents = load_recents(recents_file_name)
+    # Oldest creations are dropped automatically once max_recents is reached
+    recents: collections.deque[dict] = collections.deque(
+        load_recents(recents_file_name), maxlen=max_recents
+    )
     recent_index = 0
 
+    recent_image_cache = ImageCache(executor=io_executor)
+
+    # Files are written and uploaded on io_executor so the display does not
+    # wait for the disk or network. Tasks are waited on before anything
+    # depends on them.
+    pending_writes = {}
+    pending_uploads = {}
+
+    # Speech that is still playing in the background must finish before the
+    # next line is spoken
+    pending_speech = {}
+
     daydream = False
-    manual_daydream_timestamps = []
+    manual_daydream_timestamps: collections.deque[float] = collections.deque()
 
     previous_user_prompt = ""
     user_prompt = ""
 
     base_file_name = None
 
+    # QR codes are cached by base file name since the URL depends only on it.
+    # Surfaces are built on io_executor, so the cache holds their futures.
+    qr_surface_cache: collections.OrderedDict[str, Future] = collections.OrderedDict()
+
     show_status_screen(
         surface=disp_surface, text="Ready", status_screen_obj=status_screen
     )
@@ -622,35 +956,49 @@ def main() -> None:
         min_daydream_time, max_daydream_time
     )
 
+    # Daydream hours have hour granularity, so checking them every 30 seconds
+    # is sufficient
+    daydream_gate_open = is_daydream_time(
+        start_hour=daydream_start_hour,
+        end_hour=daydream_end_hour,
+        iso_weekdays=daydream_iso_weekdays,
+    )
+
+    pygame.time.set_timer(DAYDREAM_GATE_EVENT, 30000)
+
     while True:
         # Clear any accumulated events
         _ = pygame.event.get()
 
         while True:
-            # Slow down loop to reduce power consumption
-            time.sleep(0.1)
-
-            if manual_daydream_timestamps:
-                if (
-                    time.monotonic() - manual_daydream_timestamps[0]
-                    > manual_daydream_window
-                ):
-                    logger.debug(
-                        f"Removing expired daydream timestamp {manual_daydream_timestamps[0]} at {time.monotonic()}"
-                    )
-                    manual_daydream_timestamps = manual_daydream_timestamps[1:]
+            if daydream_gate_open:
+                # Wake up when the next automatic daydream is due
+                timeout = max(1, int((next_change_time - time.monotonic()) * 1000))
+            else:
+                # Nothing can happen until an event arrives, including the timer
+                # event that reopens the daydream gate
+                timeout = 0
 
             user_action = check_for_event(
                 js=js,
                 button_config=button_config,
+                timeout=timeout,
             )
 
-            time_now = datetime.datetime.now()
+            if user_action == UserAction.UPDATE_DAYDREAM_GATE:
+                daydream_gate_open = is_daydream_time(
+                    start_hour=daydream_start_hour,
+                    end_hour=daydream_end_hour,
+                    iso_weekdays=daydream_iso_weekdays,
+                )
 
+            # Due daydream is checked on every wake-up that is not a user
+            # request, since a steady stream of unrelated events would
+            # otherwise keep the wait from ever timing out
             if (
-                time_now.hour >= config["daydream_start_hour"]
-                and time_now.hour < config["daydream_end_hour"]
-                and time_now.isoweekday() in config["daydream_iso_weekdays"]
+                user_action
+                in (None, UserAction.CHECK_DAYDREAM, UserAction.UPDATE_DAYDREAM_GATE)
+                and daydream_gate_open
                 and time.monotonic() >= next_change_time
             ):
                 user_action = UserAction.AUTO_DAYDREAM
@@ -660,6 +1008,9 @@ def main() -> None:
             if user_action == UserAction.QUIT:
                 logger.info("*** A.R.T.I.S.T. is shutting down. ***")
 
+                wait_for_tasks(pending_writes)
+                wait_for_tasks(pending_uploads)
+
                 # This is a workaround for crash-to-desktop issues until the code
                 # can be refactored for better error handling. A shell script should
                 # check for this file, and if it does not exist, restart the program.
@@ -674,7 +1025,19 @@ def main() -> None:
                 daydream = False
                 break
             elif user_action == UserAction.DAYDREAM:
-                if len(manual_daydream_timestamps) < config["manual_daydream_limit"]:
+                # Expired requests are removed right before the limit is
+                # checked so that the check is never based on stale entries
+                while (
+                    manual_daydream_timestamps
+                    and time.monotonic() - manual_daydream_timestamps[0]
+                    > manual_daydream_window
+                ):
+                    logger.debug(
+                        f"Removing expired daydream timestamp {manual_daydream_timestamps[0]} at {time.monotonic()}"
+                    )
+                    manual_daydream_timestamps.popleft()
+
+                if len(manual_daydream_timestamps) < manual_daydream_limit:
                     daydream_timestamp = time.monotonic()
 
                     logger.debug(f"Manual daydream request at {daydream_timestamp}.")
@@ -682,9 +1045,7 @@ def main() -> None:
                     daydream = True
                     break
                 else:
-                    speech_svc.speak_text(
-                        text=random.choice(config["daydream_refusal_lines"])
-                    )
+                    speech_svc.speak_text(text=random.choice(daydream_refusal_lines))
                     logger.debug("Manual daydream request refused.")
             elif user_action == UserAction.SHOW_PROMPT:
                 if base_file_name:
@@ -695,35 +1056,43 @@ def main() -> None:
                         ),
                         width=int(display_width * 0.75),
                         height=int(display_height * 0.4),
-                        font_name=config["prompt_font"],
-                        font_size=config["prompt_font_size"],
+                        font_name=prompt_font,
+                        font_size=prompt_font_size,
                     )
 
                     x_pos = int((display_width - prompt_surface.get_width()) / 2)
                     y_pos = int((display_height - prompt_surface.get_height()) / 2)
 
-                    disp_surface.blit(prompt_surface, (x_pos, y_pos))
-                    pygame.display.update()
+                    # Only the area covered by the prompt needs to be updated,
+                    # both to show it and to remove it
+                    prompt_rect = disp_surface.blit(prompt_surface, (x_pos, y_pos))
+                    pygame.display.update(prompt_rect)
 
-                    time.sleep(config["prompt_display_time"])
+                    time.sleep(prompt_display_time)
 
-                    disp_surface.blit(artist_canvas.surface, (0, 0))
-                    pygame.display.update()
+                    update_display(disp_surface, artist_canvas.surface, prompt_rect)
             elif user_action == UserAction.SHOW_QR:
                 # Quick way to make sure a creation has already been generated
                 if base_file_name:
-                    img_url = f"https://{storage_account}.blob.core.windows.net/{storage_container}/{base_file_name}.html"
-                    qr_img = qrcode.make(img_url)
-                    qr_img_data = io.BytesIO()
+                    # Page that the QR code links to, and the screenshot shown
+                    # on it, may still be uploading
+                    wait_for_tasks(pending_writes)
+                    wait_for_tasks(pending_uploads)
 
-                    qr_img.save(qr_img_data, format="PNG")
+                    qr_future = qr_surface_cache.get(base_file_name)
 
-                    # Need to return pointer to start of data before reading
-                    qr_img_data.seek(0)
+                    if qr_future is None:
+                        img_url = f"https://{storage_account}.blob.core.windows.net/{storage_container}/{base_file_name}.html"
+                        qr_future = io_executor.submit(get_qr_surface, img_url)
 
-                    # "qr.png" is a name hint to assist in file format detection, not
-                    # an actual file on disk
-                    qr_surf = pygame.image.load(qr_img_data, "qr.png")
+                        qr_surface_cache[base_file_name] = qr_future
+
+                        if len(qr_surface_cache) > 16:
+                            qr_surface_cache.popitem(last=False)
+                    else:
+                        qr_surface_cache.move_to_end(base_file_name)
+
+                    qr_surf = qr_future.result()
 
                     qr_width = qr_surf.get_width()
                     qr_height = qr_surf.get_height()
@@ -731,12 +1100,13 @@ def main() -> None:
                     qr_x_pos = (display_width - qr_width) // 2
                     qr_y_pos = (display_height - qr_height) // 2
 
-                    disp_surface.blit(qr_surf, (qr_x_pos, qr_y_pos))
-                    pygame.display.update()
-                    time.sleep(config["qr_display_time"])
+                    # Only the area covered by the QR code needs to be updated,
+                    # both to show it and to remove it
+                    qr_rect = disp_surface.blit(qr_surf, (qr_x_pos, qr_y_pos))
+                    pygame.display.update(qr_rect)
+                    time.sleep(qr_display_time)
 
-                    disp_surface.blit(artist_canvas.surface, (0, 0))
-                    pygame.display.update()
+                    update_display(disp_surface, artist_canvas.surface, qr_rect)
 
                     # Don't break out of the loop after QR has been shown since no
                     # further action is required
@@ -754,13 +1124,25 @@ def main() -> None:
 
                     daydream = recents[recent_index]["daydream"]
 
-                    recent_img = pygame.image.load(
+                    # Image of the latest creation may still be being written
+                    wait_for_tasks(pending_writes)
+
+                    recent_img = recent_image_cache.get(
                         os.path.join(output_dir, f"{base_file_name}.png")
                     )
 
+                    # Load neighboring creations in the background so that
+                    # scrolling to them is immediate
+                    for neighbor_index in [recent_index - 1, recent_index + 1]:
+                        neighbor_name = recents[neighbor_index % len(recents)][
+                            "base_name"
+                        ]
+                        recent_image_cache.prefetch(
+                            os.path.join(output_dir, f"{neighbor_name}.png")
+                        )
+
                     artist_canvas.surface.blit(recent_img, (0, 0))
-                    disp_surface.blit(artist_canvas.surface, (0, 0))
-                    pygame.display.update()
+                    update_display(disp_surface, artist_canvas.surface)
 
         if not daydream:
             logger.info("=== Starting new creation ===")
@@ -770,9 +1152,7 @@ def main() -> None:
             )
 
             greeting_phrase = (
-                random.choice(config["welcome_words"])
-                + " "
-                + random.choice(config["welcome_lines"])
+                random.choice(welcome_words) + " " + random.choice(welcome_lines)
             )
 
             speech_svc.speak_text(text=greeting_phrase)
@@ -799,7 +1179,13 @@ def main() -> None:
                         status_screen_obj=status_screen,
                     )
 
-                    speech_svc.speak_text(text=random.choice(config["working_lines"]))
+                    # Working line plays while the prompt is transcribed and the
+                    # creation is generated, and only has to finish before the
+                    # next line is spoken
+                    speech_future = executor.submit(
+                        speech_svc.speak_text, text=random.choice(working_lines)
+                    )
+                    pending_speech[speech_future] = "speaking working line"
 
                     user_prompt = transcriber.transcribe(audio_stream=in_stream)
 
@@ -819,7 +1205,6 @@ def main() -> None:
                 continue
         else:
             logger.info("=== Starting daydream ===")
-            ai_artist.reset()
 
             show_status_screen(
                 surface=disp_surface,
@@ -829,7 +1214,7 @@ def main() -> None:
 
             # Only speak line if daydream is manually initiated
             if user_action == UserAction.DAYDREAM:
-                speech_svc.speak_text(text=random.choice(config["daydream_lines"]))
+                speech_svc.speak_text(text=random.choice(daydream_lines))
 
             if previous_user_prompt:
                 daydream_prompt = previous_user_prompt
@@ -837,45 +1222,63 @@ def main() -> None:
                 daydream_prompt = " something completely random."
 
             logger.debug(f"Daydreaming based on: {daydream_prompt}")
+            # Artist is a single-turn character so no history is needed
             user_prompt = ai_artist.get_chat_response(
-                message=config["artist_base_prompt"] + " " + daydream_prompt
+                message=artist_base_prompt + " " + daydream_prompt, one_shot=True
             ).content
 
             logger.info(f"Daydreamed: {user_prompt}")
 
-        base_file_name = get_random_string(config["file_name_length"])
+        base_file_name = get_random_string(file_name_length)
 
         logger.info(f"Base name: {base_file_name}")
 
-        img_prompt = random.choice(config["image_base_prompts"]) + user_prompt
+        img_prompt = random.choice(image_base_prompts) + user_prompt
         previous_user_prompt = user_prompt
 
         can_create = moderator.check_msg(msg=img_prompt)
         creation_failed = False
 
         if can_create:
+            # Image and verse generation are independent network requests, so
+            # run them at the same time rather than one after the other
+            img_future = executor.submit(
+                generate_image, painter=painter, prompt=img_prompt
+            )
+
+            if use_critic:
+                logger.debug("Getting best verse...")
+                verse_future = executor.submit(
+                    get_best_verse,
+                    poet=poet,
+                    critic=critic,
+                    base_prompt=verse_base_prompt,
+                    user_prompt=user_prompt,
+                    num_verses=num_verses,
+                )
+            else:
+                logger.debug("Getting one verse...")
+                verse_future = executor.submit(
+                    get_one_verse,
+                    poet=poet,
+                    base_prompt=verse_base_prompt,
+                    user_prompt=user_prompt,
+                )
+
             try:
-                img_bytes = painter.generate_image_data(prompt=img_prompt)
+                img = img_future.result()
             except Exception as e:
+                logger.error("Error generating image")
+                logger.exception(e)
                 creation_failed = True
 
-            if not creation_failed:
-                if use_critic:
-                    logger.debug("Getting best verse...")
-                    verse = get_best_verse(
-                        poet=poet,
-                        critic=critic,
-                        base_prompt=config["verse_base_prompt"],
-                        user_prompt=user_prompt,
-                        num_verses=num_verses,
-                    )
-                else:
-                    logger.debug("Getting one verse...")
-                    verse = get_one_verse(
-                        poet=poet,
-                        base_prompt=config["verse_base_prompt"],
-                        user_prompt=user_prompt,
-                    )
+            if creation_failed:
+                # Poet and critic keep conversation state, so make sure they are
+                # idle before the next creation starts
+                verse_future.cancel()
+                wait([verse_future])
+            else:
+                verse = verse_future.result()
 
                 verse_lines = verse.split("\n")
 
@@ -884,7 +1287,9 @@ def main() -> None:
 
                 img_side = random.choice(["left", "right"])
 
-                finished_phrase = random.choice(config["finished_lines"])
+                finished_phrase = random.choice(finished_lines)
+
+                wait_for_tasks(pending_speech)
 
                 if not daydream:
                     speech_svc.speak_text(text=finished_phrase)
@@ -893,60 +1298,83 @@ def main() -> None:
                 elif user_action == UserAction.DAYDREAM:
                     speech_svc.speak_text(text=user_prompt, use_cache=False)
 
-                # raw_image.png is a name hint to assist in file format detection, not
-                # an actual file on disk
-                img = pygame.image.load(io.BytesIO(img_bytes), "raw_image.png")
-
                 creation = ArtistCreation(img, verse_lines, user_prompt, daydream)
                 artist_canvas.render_creation(creation, img_side)
-                disp_surface.blit(artist_canvas.surface, (0, 0))
-                pygame.display.update()
+                update_display(disp_surface, artist_canvas.surface)
 
                 logger.debug("Saving creation...")
                 screenshot_file_name = base_file_name + ".png"
-                pygame.image.save(
-                    disp_surface, os.path.join(output_dir, screenshot_file_name)
-                )
+
+                # Previous tasks must finish first so that an older recents
+                # list cannot overwrite a newer one
+                wait_for_tasks(pending_writes)
+                wait_for_tasks(pending_uploads)
 
                 logger.debug("Uploading creation...")
                 image_url = f"https://{storage_account}.blob.core.windows.net/{storage_container}/{screenshot_file_name}"
 
-                html_bytes = io.BytesIO()
+                template_values = {
+                    "IMG-URL": image_url,
+                    "PROMPT": user_prompt,
+                    "GEN-BY": "A.R.T.I.S.T. Daydream" if daydream else "User Request",
+                    "TIME": time.asctime(),
+                }
 
-                with open(config["html_template"], "r") as template_file:
-                    for line in template_file:
-                        out_line = line.replace("***IMG-URL***", image_url)
-                        out_line = out_line.replace("***PROMPT***", user_prompt)
-                        out_line = out_line.replace(
-                            "***GEN-BY***",
-                            "A.R.T.I.S.T. Daydream" if daydream else "User Request",
-                        )
-                        out_line = out_line.replace("***TIME***", time.asctime())
+                # All placeholders are replaced in a single pass over the template
+                html_page = TEMPLATE_PLACEHOLDER_PATTERN.sub(
+                    lambda match: template_values[match.group(1)], html_template
+                )
 
-                        html_bytes.write(out_line.encode())
+                # HTML page does not depend on the screenshot, so its upload
+                # starts before the screenshot is encoded. Both continue in the
+                # background while the creation is on display.
+                html_upload_future = io_executor.submit(
+                    storage.upload_blob,
+                    blob_name=base_file_name + ".html",
+                    data=html_page.encode(),
+                    content_type="text/html",
+                )
+                pending_uploads[html_upload_future] = "uploading HTML"
+
+                screenshot_path = os.path.join(output_dir, screenshot_file_name)
+
+                # Screenshot is encoded once and the bytes are then written and
+                # uploaded as separate tasks, so that waiting for the file to
+                # be written never waits for the upload. Encoding is submitted
+                # first, so it is always running before the tasks that wait
+                # for it. Display surface is copied since it will change before
+                # the screenshot has been encoded.
+                screenshot_data_future = io_executor.submit(
+                    encode_screenshot,
+                    screenshot=disp_surface.copy(),
+                    name_hint=screenshot_path,
+                )
 
-                html_bytes.seek(0)
+                screenshot_write_future = io_executor.submit(
+                    write_encoded_file,
+                    file_name=screenshot_path,
+                    data_future=screenshot_data_future,
+                )
+                pending_writes[screenshot_write_future] = "saving screenshot"
+
+                screenshot_upload_future = io_executor.submit(
+                    upload_encoded_blob,
+                    storage=storage,
+                    blob_name=screenshot_file_name,
+                    data_future=screenshot_data_future,
+                    content_type="image/png",
+                )
+                pending_uploads[screenshot_upload_future] = "uploading screenshot"
 
-                try:
-                    storage.upload_blob(
-                        blob_name=base_file_name + ".html",
-                        data=html_bytes.read(),
-                        content_type="text/html",
-                    )
-                except Exception as e:
-                    logger.error("Error uploading HTML to blob storage")
-                    logger.exception(e)
-
-                with open(os.path.join(output_dir, screenshot_file_name), "rb") as f:
-                    try:
-                        storage.upload_blob(
-                            blob_name=base_file_name + ".png",
-                            data=f.read(),
-                            content_type="image/png",
-                        )
-                    except Exception as e:
-                        logger.error("Error uploading screenshot to blob storage")
-                        logger.exception(e)
+                # QR code is built while the creation is on display so that it
+                # is ready as soon as it is requested
+                html_url = f"https://{storage_account}.blob.core.windows.net/{storage_container}/{base_file_name}.html"
+                qr_surface_cache[base_file_name] = io_executor.submit(
+                    get_qr_surface, html_url
+                )
+
+                if len(qr_surface_cache) > 16:
+                    qr_surface_cache.popitem(last=False)
 
                 logger.debug("Updating recent creations...")
                 recents.append(
@@ -957,10 +1385,12 @@ def main() -> None:
                     }
                 )
 
-                if len(recents) > config["max_recents"]:
-                    recents = recents[-config["max_recents"] :]
-
-                save_recents(recents, recents_file_name)
+                # Copy is saved as a list since recents may change before the
+                # write runs
+                recents_write_future = io_executor.submit(
+                    save_recents, list(recents), recents_file_name
+                )
+                pending_writes[recents_write_future] = "saving recent creations"
 
                 recent_index = len(recents) - 1
 
@@ -975,7 +1405,8 @@ def main() -> None:
                 status_screen_obj=status_screen,
             )
 
-            speech_svc.speak_text(text=random.choice(config["failed_lines"]))
+            wait_for_tasks(pending_speech)
+            speech_svc.speak_text(text=random.choice(failed_lines))
 
 
 if __name__ == "__main__":
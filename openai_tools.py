@@ -34,15 +34,24 @@ logger = logging.getLogger(get_logger_name())
 
 class Transcriber:
     def __init__(
-        self, channels: int, sample_width: int, framerate: int, model: str, api_key: str
+        self,
+        channels: int,
+        sample_width: int,
+        framerate: int,
+        model: str,
+        api_key: str,
+        openai_client: OpenAI | None = None,
     ) -> None:
         self.channels = channels
         self.sample_width = sample_width
         self.framerate = framerate
         self.model = model
 
-        self._openai_client = OpenAI()
-        self._openai_client.api_key = api_key
+        if openai_client:
+            self._openai_client = openai_client
+        else:
+            self._openai_client = OpenAI()
+            self._openai_client.api_key = api_key
 
     def transcribe(self, audio_stream: bytes) -> str:
         """
@@ -82,6 +91,13 @@ class ChatResponse:
     def content(self) -> str:
         return self._response.choices[0].message.content
 
+    @property
+    def contents(self) -> list[str]:
+        """
+        Content of every choice, for responses requested with n > 1.
+        """
+        return [choice.message.content for choice in self._response.choices]
+
     @property
     def total_tokens_used(self) -> int:
         return self._response.usage.total_tokens
@@ -96,6 +112,7 @@ class ChatCharacter:
         temperature: float = 0.8,
         presence_penalty: float = 0.0,
         frequency_penalty: float = 0.0,
+        openai_client: OpenAI | None = None,
     ) -> None:
         self._system_prompt = system_prompt
         self._model = model
@@ -103,8 +120,11 @@ class ChatCharacter:
         self._presence_penalty = presence_penalty
         self._frequency_penalty = frequency_penalty
 
-        self._openai_client = OpenAI()
-        self._openai_client.api_key = api_key
+        if openai_client:
+            self._openai_client = openai_client
+        else:
+            self._openai_client = OpenAI()
+            self._openai_client.api_key = api_key
 
         self.reset()
 
@@ -122,17 +142,36 @@ class ChatCharacter:
         else:
             raise RuntimeError("Invalid structure of ChatCharacter._messages")
 
-    def get_chat_response(self, message: str) -> ChatResponse:
-        self._messages.append({"role": "user", "content": message})
+    def get_chat_response(
+        self, message: str, n: int = 1, one_shot: bool = False
+    ) -> ChatResponse:
+        """
+        Get a response to message. If n is greater than 1, n independent
+        choices are generated in the same request. Only the first choice is
+        added to the conversation history.
+
+        If one_shot is True, message is sent with only the system prompt and
+        the conversation history is left unchanged. One-shot requests do not
+        modify the character, so they can be made from several threads at once.
+        """
+        user_message = {"role": "user", "content": message}
+
+        if one_shot:
+            messages = [self._messages[0], user_message]
+        else:
+            self._messages.append(user_message)
+            messages = self._messages
 
         response = self._openai_client.chat.completions.create(
             model=self._model,
-            messages=self._messages,
+            messages=messages,
             temperature=self._temperature,
             presence_penalty=self._presence_penalty,
             frequency_penalty=self._frequency_penalty,
+            n=n,
         )
 
-        self._messages.append(response.choices[0].message)
+        if not one_shot:
+            self._messages.append(response.choices[0].message)
 
         return ChatResponse(response)
@@ -0,0 +1,119 @@
+# MIT License
+
+# Copyright (c) 2023 David Rice
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from log_config import get_logger_name
+
+logger = logging.getLogger(get_logger_name())
+
+
+class ResponseCache:
+    """
+    Persistent cache of API responses, stored in a SQLite database so that
+    repeated requests with the same input do not need another round-trip.
+
+    Values must be serializable to JSON. Recently used values are also kept
+    in memory, up to max_memory_entries, so that repeated lookups do not need
+    to query the database.
+    """
+
+    def __init__(self, db_path: str, max_memory_entries: int = 512) -> None:
+        # Connection is shared between threads, so access is serialized
+        self._lock = threading.Lock()
+
+        # Values are kept as JSON so that callers never share a mutable object
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._max_memory_entries = max_memory_entries
+
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._connection.commit()
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """
+        Build a cache key from the parts of a request, e.g., the endpoint name,
+        model and input text.
+        """
+        key_hash = hashlib.blake2b(digest_size=16)
+
+        for part in parts:
+            key_hash.update(part.encode("utf-8"))
+            key_hash.update(b"\0")
+
+        return key_hash.hexdigest()
+
+    def get(self, key: str) -> Any | None:
+        """
+        Return the cached value for key, or None if there is no cached value.
+        """
+        with self._lock:
+            value_json = self._memory.get(key)
+
+            if value_json is not None:
+                self._memory.move_to_end(key)
+            else:
+                row = self._connection.execute(
+                    "SELECT value FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+
+                if row is None:
+                    return None
+
+                value_json = row[0]
+                self._remember(key, value_json)
+
+        return json.loads(value_json)
+
+    def put(self, key: str, value: Any) -> None:
+        value_json = json.dumps(value)
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value) VALUES (?, ?)",
+                (key, value_json),
+            )
+            self._connection.commit()
+
+            self._remember(key, value_json)
+
+    def _remember(self, key: str, value_json: str) -> None:
+        """
+        Keep a value in memory, dropping the least recently used values if
+        there are too many. Must be called with the lock held.
+        """
+        self._memory[key] = value_json
+        self._memory.move_to_end(key)
+
+        while len(self._memory) > self._max_memory_entries:
+            self._memory.popitem(last=False)